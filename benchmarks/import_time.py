@@ -0,0 +1,107 @@
+"""
+CLI cold-start check based on `python -X importtime`.
+
+Runs `main.py --help` and a non-search generation against a stub Ollama,
+reports the slowest imports, and exits non-zero if the import time goes over
+the budget or a module that should load lazily (e.g. duckduckgo_search) shows
+up where it is not needed. The budgets come from `import_budget_ms` in
+config.json ({"help": ..., "generate": ...}) unless given on the command line:
+
+    python benchmarks/import_time.py --budget-ms 120
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from stub_ollama import StubOllama
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MAIN_PY = os.path.join(ROOT, "pr_agent", "main.py")
+CONFIG_PATH = os.path.join(ROOT, "pr_agent", "config.json")
+
+# Used when config.json has no import_budget_ms; about twice what a developer laptop measures
+DEFAULT_BUDGETS_MS = {"help": 120, "generate": 350}
+
+# Optional dependencies that must not be imported unless their feature is used
+LAZY_MODULES = ("duckduckgo_search", "sqlite3", "http.server", "subprocess")
+
+def parse_importtime(stderr: str):
+    """Returns ({module: cumulative_us}, total_us) from -X importtime output."""
+    modules, total = {}, 0
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        modules[name.strip()] = int(cumulative)
+        # Top-level imports are not indented; their cumulative times add up to the total
+        if not name.startswith("  "):
+            total += int(cumulative)
+    return modules, total
+
+def measure(args, runs: int):
+    """Runs main.py with -X importtime `runs` times; returns (median total ms, modules of the last run)."""
+    totals = []
+    for _ in range(runs):
+        proc = subprocess.run([sys.executable, "-X", "importtime", MAIN_PY, *args],
+                              capture_output=True, text=True, check=True)
+        modules, total = parse_importtime(proc.stderr)
+        totals.append(total / 1000)
+    return statistics.median(totals), modules
+
+def main():
+    parser = argparse.ArgumentParser(description="Check CLI import time against a budget")
+    parser.add_argument("--budget-ms", type=float,
+                        help="Maximum median import time for --help (ms; default: import_budget_ms.help in config.json)")
+    parser.add_argument("--generate-budget-ms", type=float,
+                        help="Maximum median import time for a non-search generation "
+                             "(ms; default: import_budget_ms.generate in config.json)")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10, help="Number of slowest imports to list")
+    args = parser.parse_args()
+
+    with open(CONFIG_PATH, "r", encoding='utf-8') as f:
+        config = json.load(f)
+    budgets = dict(DEFAULT_BUDGETS_MS, **config.get("import_budget_ms", {}))
+    help_budget = args.budget_ms if args.budget_ms is not None else budgets["help"]
+    generate_budget = args.generate_budget_ms if args.generate_budget_ms is not None else budgets["generate"]
+    failures = []
+    with StubOllama() as stub:
+        config.update(api_url=stub.api_url, endpoints=None, use_search=False, response_cache=False)
+        with tempfile.NamedTemporaryFile("w", suffix=".json", delete=False, encoding='utf-8') as f:
+            json.dump(config, f, ensure_ascii=False)
+            config_path = f.name
+        try:
+            # (name, arguments, budget, lazy modules that this command does need)
+            scenarios = [
+                ("--help", ["--config", config_path, "--help"], help_budget, ()),
+                # Characters are looked up in the SQLite character store
+                ("generate", ["--config", config_path, "pr", "--input", "Refactored login logic", "--no-stream"],
+                 generate_budget, ("sqlite3",)),
+            ]
+            for name, cli_args, budget, needed in scenarios:
+                total_ms, modules = measure(cli_args, args.runs)
+                status = "ok" if total_ms <= budget else "OVER BUDGET"
+                print(f"{name}: {total_ms:.1f} ms of imports (budget {budget:.0f} ms) {status}")
+                for module, cumulative in sorted(modules.items(), key=lambda item: -item[1])[:args.top]:
+                    print(f"  {cumulative / 1000:8.1f} ms  {module}")
+                if total_ms > budget:
+                    failures.append(f"{name} imports take {total_ms:.1f} ms (budget {budget:.0f} ms)")
+                loaded = [module for module in LAZY_MODULES if module in modules and module not in needed]
+                if loaded:
+                    failures.append(f"{name} imports {', '.join(loaded)}, which should load lazily")
+        finally:
+            os.unlink(config_path)
+
+    if failures:
+        print("FAILED:\n  " + "\n  ".join(failures))
+        sys.exit(1)
+    print("Import budget OK")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,323 @@
+"""
+Benchmarks for the PR message generator, run against a local stub Ollama.
+
+Measures OllamaClient latency and time-to-first-token, throughput under
+concurrency and across several endpoints, the prompt pipeline, character
+store lookups, length-budgeted generation, and CLI cold start (direct and through the resident daemon).
+Results are written as JSON so runs from different versions can be compared:
+
+    python benchmarks/run_benchmarks.py --output bench_results.json
+    python benchmarks/run_benchmarks.py --compare bench_results.json
+"""
+import argparse
+import json
+import os
+import platform
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from pr_agent.character_store import CharacterStore
+from pr_agent.client import OllamaClient
+from pr_agent.diff import compact_diff, estimate_tokens
+from pr_agent.pipeline import generate_message
+from pr_agent.prompts import build_request_input, get_chat_messages, get_messages
+from pr_agent.search import format_quote_context
+from stub_ollama import StubOllama
+
+MAIN_PY = os.path.join(ROOT, "pr_agent", "main.py")
+HOOK_PY = os.path.join(ROOT, "pr_agent", "hook.py")
+CONFIG_PATH = os.path.join(ROOT, "pr_agent", "config.json")
+
+def percentile(samples, pct: float) -> float:
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+def summarize(samples) -> dict:
+    return {
+        "n": len(samples),
+        "mean_ms": round(statistics.mean(samples) * 1000, 2),
+        "p50_ms": round(percentile(samples, 50) * 1000, 2),
+        "p95_ms": round(percentile(samples, 95) * 1000, 2),
+    }
+
+def bench_client_latency(stub: StubOllama, iterations: int) -> dict:
+    client = OllamaClient(api_url=stub.api_url, model="gemma3:4b")
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        client.generate_text("bench")
+        samples.append(time.perf_counter() - start)
+    return summarize(samples)
+
+def bench_time_to_first_token(stub: StubOllama, iterations: int) -> dict:
+    client = OllamaClient(api_url=stub.api_url, model="gemma3:4b")
+    ttft, total = [], []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        first = None
+        for _token in client.generate_stream("bench"):
+            if first is None:
+                first = time.perf_counter() - start
+        ttft.append(first or 0.0)
+        total.append(time.perf_counter() - start)
+    return {"ttft": summarize(ttft), "total": summarize(total)}
+
+def bench_concurrency(stub: StubOllama, workers: int, requests: int) -> dict:
+    client = OllamaClient(api_url=stub.api_url, model="gemma3:4b", pool_size=workers)
+    samples = []
+
+    def one(_):
+        start = time.perf_counter()
+        client.generate_text("bench")
+        samples.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(one, range(requests)))
+    elapsed = time.perf_counter() - start
+    return dict(summarize(samples), workers=workers, requests_per_sec=round(requests / elapsed, 2))
+
+def bench_multi_endpoint(args, requests: int) -> dict:
+    """
+    Throughput with one vs. two endpoints that each serve one generation at a
+    time (like a default Ollama), plus failover past a dead and a failing endpoint.
+    """
+    stub_config = dict(latency=args.latency, tokens_per_sec=args.tokens_per_sec, parallel=1)
+    results = {}
+    with StubOllama(**stub_config) as first, StubOllama(**stub_config) as second, StubOllama(error_rate=1.0) as failing:
+        for name, urls in (("one_endpoint", [first.api_url]), ("two_endpoints", [first.api_url, second.api_url])):
+            client = OllamaClient(model="gemma3:4b", pool_size=args.workers, endpoints=urls)
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=args.workers) as executor:
+                list(executor.map(lambda _: client.generate_text("bench"), range(requests)))
+            elapsed = time.perf_counter() - start
+            results[name] = {"requests_per_sec": round(requests / elapsed, 2),
+                             "requests_per_endpoint": [stats["requests"] for stats in client.endpoint_stats()]}
+
+        # Port 9 (discard) is not listening: connection refused
+        client = OllamaClient(model="gemma3:4b", endpoints=["http://127.0.0.1:9/api/generate", failing.api_url, first.api_url])
+        samples, errors = [], 0
+        for _ in range(args.iterations):
+            start = time.perf_counter()
+            try:
+                client.generate_text("bench")
+            except Exception:
+                errors += 1
+            samples.append(time.perf_counter() - start)
+        results["failover"] = dict(summarize(samples), errors=errors)
+    return results
+
+def _synthetic_diff(files: int, lines: int) -> str:
+    parts = []
+    for i in range(files):
+        parts.append(f"diff --git a/src/module_{i}.py b/src/module_{i}.py\n--- a/src/module_{i}.py\n+++ b/src/module_{i}.py\n")
+        parts.append(f"@@ -1,{lines} +1,{lines} @@\n")
+        parts.extend(f"-old_value_{j} = compute({j})\n+new_value_{j} = compute({j}, cache=True)\n" for j in range(lines // 2))
+    parts.append("diff --git a/package-lock.json b/package-lock.json\n--- a/package-lock.json\n+++ b/package-lock.json\n@@ -1 +1 @@\n-{}\n+{\"lockfileVersion\": 3}\n")
+    return "".join(parts)
+
+def bench_prompt_pipeline(iterations: int) -> dict:
+    with open(CONFIG_PATH, "r", encoding='utf-8') as f:
+        character = json.load(f)["characters"][0]
+    diff = _synthetic_diff(files=50, lines=100)
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        compacted = compact_diff(diff).text()
+        estimate_tokens(compacted)
+        get_messages(character, build_request_input("pr", compacted), "", target_length=300)
+        samples.append(time.perf_counter() - start)
+    return dict(summarize(samples), input_bytes=len(diff.encode('utf-8')))
+
+def bench_prefix_reuse(stub: StubOllama, iterations: int) -> dict:
+    """
+    Prompt tokens the server has to evaluate per request, single prompt vs.
+    chat with a stable system prefix, next to the whole prompt's size. Every
+    request has its own changes and quotes, as when quotes are picked per diff.
+    """
+    with open(CONFIG_PATH, "r", encoding='utf-8') as f:
+        character = json.load(f)["characters"][0]
+    client = OllamaClient(api_url=stub.api_url, model="gemma3:4b")
+    results = {}
+    for mode in ("generate", "chat"):
+        counts, sizes = [], []
+        for i in range(iterations):
+            inputs = build_request_input("pr", f"Refactored module_{i} and added tests for case {i}")
+            quotes = format_quote_context(character["name"], [f"セリフ{i}-{k}：今日も全力でいくぞ！" for k in range(3)])
+            if mode == "chat":
+                prompt = get_chat_messages(character, inputs, quotes)
+                result = client.chat(prompt)
+                size = sum(len(message["content"]) for message in prompt)
+            else:
+                prompt = get_messages(character, inputs, quotes)
+                result = client.generate(prompt)
+                size = len(prompt)
+            counts.append(result.prompt_eval_count or 0)
+            # The stub's tokens: two characters each
+            sizes.append(size // 2)
+        # The first request of each mode pays for the full prompt either way
+        results[mode] = {"mean_prompt_eval_count": round(statistics.mean(counts[1:] or counts), 1),
+                         "mean_prompt_tokens": round(statistics.mean(sizes), 1)}
+    return results
+
+def bench_length_budget(args, iterations: int, target_length: int = 100) -> dict:
+    """Generation time for a model that rambles far past target_length, without and with the length budget."""
+    reply = "".join(f"この変更{i}は見事だ！レビューを頼む。" for i in range(40))
+    results = {}
+    with StubOllama(latency=args.latency, tokens_per_sec=args.tokens_per_sec, reply=reply) as stub:
+        client = OllamaClient(api_url=stub.api_url, model="gemma3:4b")
+        for name, budget in (("unbounded", None), ("budgeted", target_length)):
+            samples, lengths = [], []
+            for _ in range(iterations):
+                start = time.perf_counter()
+                result = generate_message(client, "bench", target_length=budget)
+                samples.append(time.perf_counter() - start)
+                lengths.append(len(result.text))
+            results[name] = dict(summarize(samples), mean_chars=round(statistics.mean(lengths), 1))
+    return dict(results, target_length=target_length)
+
+def bench_character_store(iterations: int, size: int = 5000) -> dict:
+    """Import, name lookup and one page of substring search in a catalog of `size` characters."""
+    with tempfile.TemporaryDirectory() as directory:
+        store = CharacterStore(os.path.join(directory, "characters.sqlite3"))
+        characters = [{"name": f"Persona {i}", "work": f"Work {i % 97}", "description": "x" * 200} for i in range(size)]
+        start = time.perf_counter()
+        store.import_characters(characters)
+        import_seconds = time.perf_counter() - start
+        lookups, searches = [], []
+        for i in range(iterations):
+            start = time.perf_counter()
+            store.find_by_name(f"persona {i * 37 % size}")
+            lookups.append(time.perf_counter() - start)
+            start = time.perf_counter()
+            store.count(f"Work {i % 97}")
+            store.search(f"Work {i % 97}", offset=0, limit=50)
+            searches.append(time.perf_counter() - start)
+        store.close()
+    return {"size": size, "import_ms": round(import_seconds * 1000, 2),
+            "find_by_name": summarize(lookups), "search_page": summarize(searches)}
+
+def bench_cli(stub: StubOllama, iterations: int) -> dict:
+    with open(CONFIG_PATH, "r", encoding='utf-8') as f:
+        config = json.load(f)
+    config.update(api_url=stub.api_url, use_search=False, response_cache=False)
+    with tempfile.NamedTemporaryFile("w", suffix=".json", delete=False, encoding='utf-8') as f:
+        json.dump(config, f, ensure_ascii=False)
+        config_path = f.name
+
+    def run(*args, script=MAIN_PY, env=None) -> float:
+        start = time.perf_counter()
+        subprocess.run([sys.executable, script, *args], check=True, capture_output=True, env=env)
+        return time.perf_counter() - start
+
+    # hook.py forwarding to a resident `main.py serve` on a free port
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    hook_env = dict(os.environ, PR_AGENT_DAEMON_URL=f"http://127.0.0.1:{port}")
+    daemon = subprocess.Popen([sys.executable, MAIN_PY, "--config", config_path, "serve", "--port", str(port)],
+                              stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    try:
+        help_samples = [run("--config", config_path, "--help") for _ in range(iterations)]
+        generate_samples = [run("--config", config_path, "pr", "--input", "Refactored login logic", "--no-cache")
+                            for _ in range(iterations)]
+        daemon.stdout.readline()  # "Serving on ..."
+        hook_samples = [run("pr", "--input", "Refactored login logic", "--no-cache", script=HOOK_PY, env=hook_env)
+                        for _ in range(iterations)]
+    finally:
+        daemon.terminate()
+        daemon.wait()
+        os.unlink(config_path)
+    return {"cold_start_help": summarize(help_samples), "generate": summarize(generate_samples),
+            "hook_via_daemon": summarize(hook_samples)}
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(["git", "-C", ROOT, "rev-parse", "--short", "HEAD"],
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+def run_all(args) -> dict:
+    results = {
+        "meta": {
+            "revision": git_revision(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "stub": {"latency": args.latency, "tokens_per_sec": args.tokens_per_sec},
+        },
+    }
+    with StubOllama(latency=args.latency, tokens_per_sec=args.tokens_per_sec) as stub:
+        results["client_latency"] = bench_client_latency(stub, args.iterations)
+        results["time_to_first_token"] = bench_time_to_first_token(stub, args.iterations)
+        results["concurrency"] = bench_concurrency(stub, args.workers, args.iterations * args.workers)
+        results["multi_endpoint"] = bench_multi_endpoint(args, args.iterations)
+        results["prompt_pipeline"] = bench_prompt_pipeline(args.iterations)
+        results["prefix_reuse"] = bench_prefix_reuse(stub, args.iterations)
+        results["character_store"] = bench_character_store(args.iterations)
+        results["length_budget"] = bench_length_budget(args, args.iterations)
+        if not args.skip_cli:
+            results["cli"] = bench_cli(stub, args.cli_iterations)
+    return results
+
+def _flatten(results: dict, prefix: str = "") -> dict:
+    flat = {}
+    for key, value in results.items():
+        if key == "meta":
+            continue
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(_flatten(value, name + "."))
+        elif isinstance(value, (int, float)):
+            flat[name] = value
+    return flat
+
+def compare(baseline: dict, current: dict):
+    """Prints the relative change of every timing/throughput metric against a baseline run."""
+    base, cur = _flatten(baseline), _flatten(current)
+    print(f"Comparing {current['meta']['revision']} against {baseline['meta']['revision']}")
+    for name in sorted(cur):
+        if name not in base or not base[name] or name.endswith(".n"):
+            continue
+        change = (cur[name] - base[name]) / base[name] * 100
+        print(f"  {name:45s} {base[name]:>10} -> {cur[name]:>10}  ({change:+.1f}%)")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the PR message generator against a stub Ollama")
+    parser.add_argument("--output", "-o", default="bench_results.json", help="Where to write the JSON results")
+    parser.add_argument("--compare", type=str, help="Previous results file to compare against")
+    parser.add_argument("--iterations", "-n", type=int, default=20)
+    parser.add_argument("--cli-iterations", type=int, default=5)
+    parser.add_argument("--workers", type=int, default=8, help="Concurrent clients for the throughput benchmark")
+    parser.add_argument("--latency", type=float, default=0.05, help="Stub delay before the first token (seconds)")
+    parser.add_argument("--tokens-per-sec", type=float, default=200, help="Stub token rate")
+    parser.add_argument("--skip-cli", action="store_true", help="Skip the subprocess-based CLI benchmarks")
+    args = parser.parse_args()
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, "r", encoding='utf-8') as f:
+            baseline = json.load(f)
+
+    results = run_all(args)
+    with open(args.output, "w", encoding='utf-8') as f:
+        json.dump(results, f, indent=2, ensure_ascii=False)
+    print(json.dumps(results, indent=2, ensure_ascii=False))
+    print(f"Results written to {args.output}")
+
+    if baseline:
+        compare(baseline, results)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,257 @@
+"""
+A local stand-in for the Ollama HTTP API, for benchmarks and offline testing.
+
+Serves `/`, `/api/tags`, `/api/ps`, `/api/generate` and `/api/chat`
+(streaming and non-streaming) with configurable prompt latency, cold model-load time, token
+rate, error injection and a limit on parallel generations (like
+OLLAMA_NUM_PARALLEL, extra requests queue). Like Ollama, an empty prompt only loads the model
+and `keep_alive: 0` unloads it. prompt_eval_count only counts the part of the
+prompt that differs from the previous request's prefix, mimicking Ollama's
+KV cache reuse. Responses
+carry the same timing fields as Ollama (total_duration, eval_count, ...).
+
+    python benchmarks/stub_ollama.py --port 11435 --latency 0.2 --tokens-per-sec 40
+"""
+import argparse
+import json
+import random
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_REPLY = "うむ！このプルリクエストは見事だ！心を燃やしてレビューしてくれ！"
+
+class StubConfig:
+    def __init__(self, latency: float = 0.0, tokens_per_sec: float = 0.0, reply: str = DEFAULT_REPLY,
+                 error_rate: float = 0.0, models=("gemma3:4b",), load_time: float = 0.0, parallel: int = 0):
+        # latency: delay before the first token (prompt eval)
+        # load_time: extra delay on the first request for a model that is not loaded
+        # tokens_per_sec: 0 means emit all tokens immediately
+        # parallel: generations served at once, 0 means unlimited
+        self.latency = latency
+        self.load_time = load_time
+        self.loaded = set()
+        self.last_prompt = {}
+        self.last_options = None
+        self.tokens_per_sec = tokens_per_sec
+        self.reply = reply
+        self.error_rate = error_rate
+        self.models = list(models)
+        self.requests = 0
+        self.slots = threading.Semaphore(parallel) if parallel else None
+        self.lock = threading.Lock()
+
+def _common_prefix(a: str, b: str) -> int:
+    n = min(len(a), len(b))
+    i = 0
+    while i < n and a[i] == b[i]:
+        i += 1
+    return i
+
+def _tokens(text: str):
+    # Two characters per token is close enough for Japanese output
+    return [text[i:i + 2] for i in range(0, len(text), 2)]
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "StubOllama/1.0"
+
+    @property
+    def stub(self) -> StubConfig:
+        return self.server.stub
+
+    def setup(self):
+        super().setup()
+        # Like Ollama's Go server: without this, Nagle + delayed ACK adds ~40ms per small write
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def log_message(self, format, *args):
+        pass
+
+    def handle(self):
+        try:
+            super().handle()
+        except (BrokenPipeError, ConnectionResetError):
+            # The client closed the connection mid-response (stopped at target_length, or timed out)
+            pass
+
+    def _send_json(self, status: int, payload: dict):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _write_chunk(self, payload: dict):
+        data = (json.dumps(payload, ensure_ascii=False) + "\n").encode('utf-8')
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        self.wfile.flush()
+
+    def do_GET(self):
+        if self.path.rstrip("/") == "/api/tags":
+            self._send_json(200, {"models": [{"name": name} for name in self.stub.models]})
+        elif self.path.rstrip("/") == "/api/ps":
+            with self.stub.lock:
+                loaded = sorted(self.stub.loaded)
+            self._send_json(200, {"models": [{"name": name, "size_vram": 0, "expires_at": ""} for name in loaded]})
+        elif self.path == "/":
+            body = b"Ollama is running"
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        if self.stub.slots is None:
+            self._handle_post()
+            return
+        with self.stub.slots:
+            self._handle_post()
+
+    def _handle_post(self):
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        with self.stub.lock:
+            self.stub.requests += 1
+
+        if self.path not in ("/api/generate", "/api/chat"):
+            self._send_json(404, {"error": "not found"})
+            return
+        is_chat = self.path == "/api/chat"
+        if is_chat:
+            prompt = "".join(f"<{m.get('role')}>{m.get('content', '')}" for m in request.get("messages", []))
+        else:
+            prompt = request.get("prompt", "")
+        if self.stub.error_rate and random.random() < self.stub.error_rate:
+            self._send_json(500, {"error": "injected failure"})
+            return
+
+        start = time.monotonic()
+        model = request.get("model", "")
+        if request.get("keep_alive") == 0 and not prompt:
+            with self.stub.lock:
+                self.stub.loaded.discard(model)
+            self._send_json(200, {"model": model, "response": "", "done": True, "done_reason": "unload"})
+            return
+
+        with self.stub.lock:
+            cold = model not in self.stub.loaded
+            self.stub.loaded.add(model)
+        load_seconds = self.stub.load_time if cold else 0.0
+        time.sleep(load_seconds)
+
+        if not prompt:
+            # Load-only request (warm-up)
+            self._send_json(200, {"model": model, "response": "", "done": True, "done_reason": "load",
+                                  "load_duration": int(load_seconds * 1e9)})
+            return
+
+        options = request.get("options") or {}
+        with self.stub.lock:
+            reused = _common_prefix(self.stub.last_prompt.get(model, ""), prompt)
+            self.stub.last_prompt[model] = prompt
+            self.stub.last_options = options
+        prompt_tokens = (len(prompt) - reused) // 2
+        time.sleep(self.stub.latency)
+        prompt_done = time.monotonic()
+        tokens = _tokens(self.stub.reply)
+        if options.get("num_predict", -1) >= 0:
+            tokens = tokens[:options["num_predict"]]
+        delay = 1.0 / self.stub.tokens_per_sec if self.stub.tokens_per_sec else 0.0
+
+        def body(text: str) -> dict:
+            if is_chat:
+                return {"message": {"role": "assistant", "content": text}}
+            return {"response": text}
+
+        def final(text: str) -> dict:
+            now = time.monotonic()
+            return {
+                "model": model, **body(text), "done": True,
+                "total_duration": int((now - start) * 1e9),
+                "load_duration": int(load_seconds * 1e9),
+                "prompt_eval_count": prompt_tokens,
+                "prompt_eval_duration": int((prompt_done - start) * 1e9),
+                "eval_count": len(tokens),
+                "eval_duration": int((now - prompt_done) * 1e9),
+            }
+
+        if not request.get("stream", True):
+            time.sleep(delay * len(tokens))
+            self._send_json(200, final("".join(tokens)))
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        try:
+            for token in tokens:
+                self._write_chunk({"model": model, **body(token), "done": False})
+                time.sleep(delay)
+            self._write_chunk(final(""))
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            # The client stopped reading (e.g. cancelled generation)
+            self.close_connection = True
+
+class StubOllama:
+    """Runs a stub server on a background thread: `with StubOllama(latency=0.1) as stub: stub.api_url`."""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, **config):
+        self.stub = StubConfig(**config)
+        self.server = ThreadingHTTPServer((host, port), StubHandler)
+        self.server.daemon_threads = True
+        self.server.stub = self.stub
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def api_url(self) -> str:
+        return self.base_url + "/api/generate"
+
+    def start(self) -> "StubOllama":
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+def main():
+    parser = argparse.ArgumentParser(description="Stub Ollama server for benchmarks")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds before the first token")
+    parser.add_argument("--tokens-per-sec", type=float, default=0.0, help="Token rate (0 = as fast as possible)")
+    parser.add_argument("--load-time", type=float, default=0.0, help="Seconds to 'load' a model that is not in memory")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of generate requests that fail with HTTP 500")
+    parser.add_argument("--parallel", type=int, default=0, help="Generations served at once (0 = unlimited)")
+    args = parser.parse_args()
+
+    stub = StubOllama(args.host, args.port, latency=args.latency, tokens_per_sec=args.tokens_per_sec,
+                      error_rate=args.error_rate, load_time=args.load_time, parallel=args.parallel)
+    print(f"Stub Ollama listening on {stub.base_url}")
+    try:
+        stub.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
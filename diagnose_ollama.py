@@ -1,8 +1,31 @@
-import urllib.request
+import argparse
 import json
+import os
+import time
+import urllib.parse
+import urllib.request
+
+CONFIG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "pr_agent", "config.json")
+
+def load_config(path):
+    try:
+        with open(path, "r", encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+def base_url_from(api_url):
+    parsed = urllib.parse.urlsplit(api_url)
+    return f"{parsed.scheme}://{parsed.netloc}"
 
-def check_ollama():
-    url = "http://localhost:11434/api/tags"
+def post_json(url, payload, timeout=600):
+    data = json.dumps(payload).encode('utf-8')
+    req = urllib.request.Request(url, data=data, headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(req, timeout=timeout) as response:
+        return json.loads(response.read().decode('utf-8'))
+
+def check_ollama(base_url):
+    url = f"{base_url}/api/tags"
     try:
         with urllib.request.urlopen(url) as response:
             if response.status == 200:
@@ -11,10 +34,73 @@ def check_ollama():
                 print("Available models:")
                 for model in data.get('models', []):
                     print(f" - {model['name']}")
+                return True
             else:
                 print(f"Ollama returned status: {response.status}")
     except Exception as e:
         print(f"Failed to connect to Ollama: {e}")
+    return False
+
+def list_loaded_models(base_url):
+    """Prints the models Ollama currently holds in memory (/api/ps)."""
+    try:
+        with urllib.request.urlopen(f"{base_url}/api/ps") as response:
+            data = json.loads(response.read().decode())
+    except Exception as e:
+        print(f"Could not list loaded models: {e}")
+        return
+    models = data.get('models', [])
+    print("Loaded models:")
+    if not models:
+        print(" (none - the next request will pay a cold model load)")
+    for model in models:
+        vram = model.get('size_vram', 0) / 1024 ** 3
+        print(f" - {model['name']} (VRAM {vram:.1f} GiB, unloads at {model.get('expires_at', '?')})")
+
+def timed_generate(base_url, model, keep_alive=None):
+    """Runs a one-token generation and returns (wall seconds, load_duration seconds)."""
+    payload = {"model": model, "prompt": "hi", "stream": False, "options": {"num_predict": 1}}
+    if keep_alive is not None:
+        payload["keep_alive"] = keep_alive
+    start = time.perf_counter()
+    result = post_json(f"{base_url}/api/generate", payload)
+    return time.perf_counter() - start, result.get("load_duration", 0) / 1e9
+
+def measure_cold_warm(base_url, model, keep_alive, skip_cold=False):
+    """Compares request latency with the model unloaded (cold) and already loaded (warm)."""
+    print(f"Measuring latency for {model}...")
+    try:
+        if not skip_cold:
+            # keep_alive=0 with an empty prompt unloads the model
+            post_json(f"{base_url}/api/generate", {"model": model, "prompt": "", "keep_alive": 0})
+            cold, cold_load = timed_generate(base_url, model, keep_alive)
+            print(f" cold: {cold * 1000:8.0f} ms (model load {cold_load * 1000:.0f} ms)")
+        warm, warm_load = timed_generate(base_url, model, keep_alive)
+        print(f" warm: {warm * 1000:8.0f} ms (model load {warm_load * 1000:.0f} ms)")
+        if not skip_cold and warm > 0:
+            print(f" A cold start costs {cold - warm:.2f}s extra. Set keep_alive in config.json (now: {keep_alive!r}) to avoid it.")
+    except Exception as e:
+        print(f"Latency measurement failed: {e}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Diagnose the Ollama server used by the PR message generator")
+    parser.add_argument("--config", default=CONFIG_PATH, help="Path to config.json")
+    parser.add_argument("--skip-cold", action="store_true", help="Do not unload the model to measure cold-start latency")
+    args = parser.parse_args()
+
+    config = load_config(args.config)
+    endpoints = config.get("endpoints") or [config.get("api_url", "http://localhost:11434/api/generate")]
+    for endpoint in endpoints:
+        api_url = endpoint if isinstance(endpoint, str) else endpoint["api_url"]
+        base_url = base_url_from(api_url)
+        if len(endpoints) > 1:
+            print(f"== {base_url} ==")
+        if not check_ollama(base_url):
+            continue
+        list_loaded_models(base_url)
+        if config.get("model"):
+            measure_cold_warm(base_url, config["model"], config.get("keep_alive"), skip_cold=args.skip_cold)
+            list_loaded_models(base_url)
 
 if __name__ == "__main__":
-    check_ollama()
+    main()
@@ -2,23 +2,37 @@ import streamlit as st
 import json
 import os
 import sys
+import threading
 
 # Adjust path to allow imports if running directly
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from pr_agent.client import OllamaClient
-from pr_agent.prompts import get_messages
-from pr_agent.search import get_random_quote_context
+from pr_agent.character_store import CharacterStore, default_store_path
+from pr_agent.client import CLIENT_CONFIG_KEYS, OllamaClient
+from pr_agent.config_store import CONFIG_PATH, ConfigStore
+from pr_agent.diff import prepare_diff_input
+from pr_agent.prompts import build_prompt
+from pr_agent.metrics import append_metrics_log, build_metrics, timed
+from pr_agent.pipeline import (generate_candidates, generate_message, generation_options, length_target,
+                               prepare_context, request_deadline, start_warm_up)
+from pr_agent.response_cache import ResponseCache
+from pr_agent.quote_index import QuoteIndex
+from pr_agent.search import QuoteCache
 
 # Page Config
 st.set_page_config(page_title="PR Message Generator", page_icon="🚀", layout="wide")
 
-CONFIG_PATH = os.path.join(os.path.dirname(__file__), "config.json")
+# Characters per page in the sidebar picker
+CHARACTER_PAGE_SIZE = 50
+
+@st.cache_resource
+def get_config_store():
+    # One store per server process: the parsed config is shared across reruns and sessions
+    return ConfigStore(CONFIG_PATH)
 
 def load_config():
     try:
-        with open(CONFIG_PATH, "r", encoding='utf-8') as f:
-            return json.load(f)
+        return get_config_store().load()
     except FileNotFoundError:
         st.error("config.json が見つかりません。")
         return None
@@ -26,67 +40,139 @@ def load_config():
         st.error(f"設定の読み込みに失敗しました: {e}")
         return None
 
-def save_config(new_config):
+def save_config(mutator):
+    """Applies `mutator` to the latest config on disk and saves it atomically."""
     try:
-        with open(CONFIG_PATH, "w", encoding='utf-8') as f:
-            json.dump(new_config, f, indent=4, ensure_ascii=False)
+        get_config_store().mutate(mutator)
         return True
     except Exception as e:
         st.error(f"設定の保存に失敗しました: {e}")
         return False
 
+def update_characters(action):
+    """Runs a change to the character store; shows the error and returns False if it fails."""
+    try:
+        action()
+        return True
+    except Exception as e:
+        st.error(f"キャラクターの保存に失敗しました: {e}")
+        return False
+
+@st.cache_resource
+def _cached_character_store(path, _config):
+    # One connection per server process
+    return CharacterStore.from_config(dict(_config, character_store_path=path))
+
+def get_character_store(config):
+    store = _cached_character_store(config.get("character_store_path") or default_store_path(CONFIG_PATH), config)
+    # Picks up edits to config.json's characters made while the UI is running
+    store.sync_config(config)
+    return store
+
+@st.cache_resource
+def _client_slot():
+    # Keep one pooled client alive across reruns so connections (and endpoint health) are reused
+    return {"key": None, "client": None, "lock": threading.Lock()}
+
+def get_client(config):
+    client_config = {key: config[key] for key in CLIENT_CONFIG_KEYS if key in config}
+    key = json.dumps(client_config, sort_keys=True)
+    slot = _client_slot()
+    with slot["lock"]:
+        if slot["key"] != key:
+            # Settings changed: stop the old client's health checks and close its connections
+            if slot["client"] is not None:
+                slot["client"].close()
+            slot["key"], slot["client"] = key, OllamaClient.from_config(client_config)
+        return slot["client"]
+
+@st.cache_resource
+def _cached_response_cache(max_entries, max_age):
+    return ResponseCache(max_entries=max_entries, max_age=max_age)
+
+def get_response_cache(config):
+    if not config.get("response_cache", False):
+        return None
+    return _cached_response_cache(config.get("response_cache_max_entries", 1000), config.get("response_cache_max_age", 30 * 86400))
+
+@st.cache_resource
+def _cached_quote_index(path):
+    # Tokenized quotes survive reruns; the index re-reads its file only when it changes
+    return QuoteIndex(path)
+
+@st.cache_resource
+def _cached_quote_cache(ttl, stale_ttl, max_entries):
+    # Shared across reruns: hits record their access time in memory until the next put
+    return QuoteCache(ttl=ttl, stale_ttl=stale_ttl, max_entries=max_entries)
+
+def get_quote_cache(config):
+    cache = QuoteCache.from_config(config)
+    return _cached_quote_cache(cache.ttl, cache.stale_ttl, cache.max_entries)
+
+def get_quote_index(config):
+    if not config.get("quote_index", True):
+        return None
+    return _cached_quote_index(QuoteIndex.from_config(config).path)
+
 def main():
-    config = load_config()
+    timings = {}
+    with timed(timings, "config_load"):
+        config = load_config()
     if not config:
         return
 
-    # Get characters list
-    characters = config.get("characters", [])
-    if not characters:
+    # Characters live in the character store (seeded from config.json on first use)
+    characters = get_character_store(config)
+    character_config = characters.active(config)
+    if character_config is None:
         st.error("キャラクターが登録されていません。")
         return
-    
-    active_index = config.get("active_character_index", 0)
-    if active_index >= len(characters):
-        active_index = 0
-        config["active_character_index"] = 0
-    
-    character_config = characters[active_index]
-    char_name = character_config.get("name", "未設定")
-    work_name = character_config.get("work", "未設定")
-    
-    # Sidebar: Character Selection
+    active_id = character_config["id"]
+
+    # Sidebar: Character Selection (searchable and paginated, so large catalogs stay fast)
     st.sidebar.header("キャラクター選択 🎭")
-    character_names = [c.get("name", f"Character {i}") for i, c in enumerate(characters)]
-    
-    selected_name = st.sidebar.selectbox(
+    query = st.sidebar.text_input("検索 (名前・作品名)", placeholder="例: ドラえもん")
+    total = characters.count(query)
+    pages = max(1, -(-total // CHARACTER_PAGE_SIZE))
+    page = st.sidebar.number_input(f"ページ (全 {pages} ページ)", min_value=1, max_value=pages, value=1) if pages > 1 else 1
+    page_characters = characters.search(query, offset=(page - 1) * CHARACTER_PAGE_SIZE, limit=CHARACTER_PAGE_SIZE)
+    if not any(c["id"] == active_id for c in page_characters):
+        # Keep the current character selectable when it is not on this page
+        page_characters.insert(0, character_config)
+    labels = {c["id"]: f"{c['name']} ({c['work']})" if c.get("work") else c["name"] for c in page_characters}
+
+    selected_id = st.sidebar.selectbox(
         "担当キャラクター",
-        character_names,
-        index=active_index,
-        key="character_selector"
+        list(labels),
+        index=list(labels).index(active_id),
+        format_func=labels.get,
     )
-    
+    st.sidebar.caption(f"{total} 件" if query else f"全 {total} キャラクター")
+
     # Update active character if changed
-    new_index = character_names.index(selected_name)
-    if new_index != active_index:
-        config["active_character_index"] = new_index
-        if save_config(config):
+    if selected_id != active_id:
+        if save_config(lambda c: c.update(active_character_id=selected_id)):
             st.rerun()
-    
-    # Use the selected character (either active_index or new_index, they should be the same at this point)
-    active_index = new_index
-    character_config = characters[active_index]
+
     char_name = character_config.get("name", "未設定")
     work_name = character_config.get("work", "未設定")
 
+    # Load the model in the background when the app starts or the character changes,
+    # so the first generation does not pay Ollama's cold model load
+    client = get_client(config)
+    warm_key = (tuple(client.api_urls), config["model"], active_id)
+    if st.session_state.get("warmed_up") != warm_key:
+        st.session_state.warmed_up = warm_key
+        start_warm_up(client)
 
-
-
-    
     # Sidebar: Info
     st.sidebar.markdown("---")
     st.sidebar.header("現在の担当 👤")
     st.sidebar.info(f"**名前:** {char_name}\n\n**作品:** {work_name}")
+
+    if len(client.endpoints) > 1:
+        with st.sidebar.expander("Ollama エンドポイント 🖥️"):
+            st.dataframe(client.endpoint_stats(), use_container_width=True)
     
     # Sidebar: Settings Editor
     with st.sidebar.expander("設定エディタ ⚙️"):
@@ -98,12 +184,8 @@ def main():
             
             submitted = st.form_submit_button("更新 💾")
             if submitted:
-                characters[active_index]["name"] = new_name
-                characters[active_index]["work"] = new_work
-                characters[active_index]["description"] = new_desc
-                config["characters"] = characters
-                
-                if save_config(config):
+                if update_characters(lambda: characters.update(active_id, {"name": new_name, "work": new_work,
+                                                                            "description": new_desc})):
                     st.success("更新しました！")
                     st.rerun()
         
@@ -137,7 +219,7 @@ def main():
                 if add_char_name and add_char_work:
                     with st.spinner(f"{add_char_name} の詳細を生成中..."):
                         try:
-                            client = OllamaClient(api_url=config["api_url"], model=config["model"])
+                            client = get_client(config)
                             prompt = f"""あなたは「{add_char_name}」（作品名: {add_char_work}）というキャラクターの専門家です。
 このキャラクターの性格、口調、決め台詞、特徴を200文字程度で簡潔に説明してください。
 PRメッセージ生成時にこのキャラクターになりきるための情報として使用します。
@@ -162,16 +244,15 @@ PRメッセージ生成時にこのキャラクターになりきるための情
                         "work": add_char_work,
                         "description": add_char_desc
                     }
-                    characters.append(new_character)
-                    config["characters"] = characters
-                    config["active_character_index"] = len(characters) - 1
+                    new_ids = []
                     
                     # Clear temp state
                     st.session_state.temp_char_name = ""
                     st.session_state.temp_char_work = ""
                     st.session_state.temp_char_desc = ""
                     
-                    if save_config(config):
+                    if (update_characters(lambda: new_ids.append(characters.add(new_character)))
+                            and save_config(lambda c: c.update(active_character_id=new_ids[0]))):
                         st.success(f"{add_char_name} を追加しました！")
                         st.rerun()
                 else:
@@ -184,13 +265,10 @@ PRメッセージ生成時にこのキャラクターになりきるための情
 
         
         # Delete character
-        if len(characters) > 1:
+        if characters.count() > 1:
             if st.button("現在のキャラクターを削除 🗑️", type="secondary"):
-                characters.pop(active_index)
-                config["characters"] = characters
-                config["active_character_index"] = 0
-                
-                if save_config(config):
+                if (update_characters(lambda: characters.delete(active_id))
+                        and save_config(lambda c: c.update(active_character_id=characters.at(0)["id"]))):
                     st.success("削除しました！")
                     st.rerun()
         
@@ -199,13 +277,15 @@ PRメッセージ生成時にこのキャラクターになりきるための情
         with st.form("generation_settings_form"):
             new_use_search = st.checkbox("インターネット検索を使用する", value=config.get("use_search", False))
             new_target_length = st.number_input("目安文字数", value=config.get("target_length", 300), step=50, min_value=50)
+            new_length_budget = st.checkbox("目安文字数で生成を打ち切る", value=config.get("length_budget", True),
+                                            help="目安文字数に達したら文の区切りで生成を止め、生成時間を短縮します。")
             
             gen_submitted = st.form_submit_button("保存 💾")
             if gen_submitted:
-                config["use_search"] = new_use_search
-                config["target_length"] = new_target_length
+                settings = {"use_search": new_use_search, "target_length": new_target_length,
+                            "length_budget": new_length_budget}
                 
-                if save_config(config):
+                if save_config(lambda c: c.update(settings)):
                     st.success("保存しました！")
                     st.rerun()
 
@@ -218,59 +298,119 @@ PRメッセージ生成時にこのキャラクターになりきるための情
     """)
 
     input_text = st.text_area("変更内容 (Diff または 要約)", height=200, placeholder="ここに git diff の結果や、変更内容の要約を貼り付けてください...")
+    candidate_count = st.number_input("候補数", min_value=1, max_value=5, value=1,
+                                      help="2以上にすると、複数の候補を並行して生成し、スコア順に表示します。")
 
     col1, col2 = st.columns(2)
     
     generate_pr = col1.button("PRメッセージを生成 ✨", type="primary", use_container_width=True)
     generate_merge = col2.button("マージメッセージを生成 🔀", use_container_width=True)
 
+    if st.session_state.pop("generation_cancelled", False):
+        st.warning("生成を中止しました。")
+
     if generate_pr or generate_merge:
         message_type = "pr" if generate_pr else "merge"
         
-        client = OllamaClient(api_url=config["api_url"], model=config["model"])
+        client = get_client(config)
+        response_cache = get_response_cache(config)
+        options = generation_options(config, use_cache=response_cache is not None)
+        # One deadline for connecting, searching, summarizing and generating
+        deadline = request_deadline(config)
+
+        # Clicking this reruns the script, which interrupts the running stream;
+        # generate_message then closes the connection so Ollama stops generating
+        st.button("生成を中止 ⏹", key="cancel_generation",
+                  on_click=lambda: st.session_state.update(generation_cancelled=True))
         
-        # Check connection
-        if not client.check_connection():
-            st.error(f"Ollama ({config['api_url']}) に接続できませんでした。Ollamaが起動しているか確認してください。")
+        # Health check and quote search run concurrently
+        quote_index = get_quote_index(config)
+        has_indexed_quotes = bool(quote_index and quote_index.quotes(char_name, character_config.get("work", "")))
+        use_search = config.get("use_search", False) and char_name and not has_indexed_quotes
+        status_label = f"Ollama への接続と {char_name} の名言検索を並行実行中..." if use_search else "Ollama への接続を確認中..."
+        with st.status(status_label, expanded=False) as status:
+            with timed(timings, "prepare"):
+                prepared = prepare_context(client, character_config, config, cache=get_quote_cache(config),
+                                           seed=options.get("seed"), deadline=deadline, index=quote_index,
+                                           query=input_text)
+            timings.update(prepared.timings)
+            if not prepared.connected:
+                status.update(label="接続失敗", state="error")
+            elif prepared.search_error:
+                status.update(label="検索失敗 (名言なしで続行します)", state="error")
+                st.write(f"エラー詳細: {prepared.search_error}")
+            else:
+                status.update(label="準備完了！", state="complete")
+
+        if not prepared.connected:
+            st.error(f"Ollama ({', '.join(client.api_urls)}) に接続できませんでした。Ollamaが起動しているか確認してください。")
             return
 
         with st.spinner(f"{char_name} がメッセージを考えています..."):
             try:
-                # Search Context (if enabled)
-                search_context = ""
-                if config.get("use_search", False) and char_name:
-                    with st.status(f"{char_name} の名言を検索中...", expanded=False) as status:
-                        try:
-                            search_context = get_random_quote_context(char_name, work_name)
-                            status.update(label="検索完了！", state="complete")
-                        except Exception as e:
-                            status.update(label="検索失敗 (名言なしで続行します)", state="error")
-                            st.write(f"エラー詳細: {e}")
+                search_context = prepared.search_context
 
-                # Context injection based on message type
+                # Drop noise from the diff and summarize it if it is over the token budget
                 if input_text:
-                    if message_type == "merge":
-                        context_prefix = "【指示: あなたはこのコードの実装者です。無事にマージが完了したことをチームに報告するメッセージを作成してください。「マージしたぞ！」というスタンスで、短潔に。】\n"
-                    else:
-                        context_prefix = "【指示: あなたはこのPRの作成者（実装者）です。チームメンバーに対して、このPRのレビューをお願いするメッセージを作成してください。「詳細な変更内容は記述しませんが、私のコードを見てくれ！」というスタンスで。レビューを依頼する立場であることを忘れないでください。】\n"
-                    full_input = context_prefix + input_text
-                else:
-                    # Empty input case: Generic message
-                    if message_type == "merge":
-                        full_input = "【指示: あなたはこのコードの実装者です。無事にマージが完了したことをチームに報告するメッセージを作成してください。「マージしたぞ！」というスタンスで、短潔に。】"
+                    with timed(timings, "diff_prep"):
+                        input_text = prepare_diff_input(client, input_text, config, options=options, cache=response_cache,
+                                                        deadline=deadline)
+
+                with timed(timings, "prompt_build"):
+                    # Context injection based on message type
+                    if input_text:
+                        if message_type == "merge":
+                            context_prefix = "【指示: あなたはこのコードの実装者です。無事にマージが完了したことをチームに報告するメッセージを作成してください。「マージしたぞ！」というスタンスで、短潔に。】\n"
+                        else:
+                            context_prefix = "【指示: あなたはこのPRの作成者（実装者）です。チームメンバーに対して、このPRのレビューをお願いするメッセージを作成してください。「詳細な変更内容は記述しませんが、私のコードを見てくれ！」というスタンスで。レビューを依頼する立場であることを忘れないでください。】\n"
+                        full_input = context_prefix + input_text
                     else:
-                        full_input = "【指示: あなたはこのPRの作成者（実装者）です。チームメンバーに対して、このPRのレビューをお願いするメッセージを作成してください。「詳細な変更内容は記述しませんが、私のコードを見てくれ！」というスタンスで。レビューを依頼する立場であることを忘れないでください。】"
+                        # Empty input case: Generic message
+                        if message_type == "merge":
+                            full_input = "【指示: あなたはこのコードの実装者です。無事にマージが完了したことをチームに報告するメッセージを作成してください。「マージしたぞ！」というスタンスで、短潔に。】"
+                        else:
+                            full_input = "【指示: あなたはこのPRの作成者（実装者）です。チームメンバーに対して、このPRのレビューをお願いするメッセージを作成してください。「詳細な変更内容は記述しませんが、私のコードを見てくれ！」というスタンスで。レビューを依頼する立場であることを忘れないでください。】"
 
-                # Generate Prompt
-                target_length = config.get("target_length", 300)
-                prompt = get_messages(character_config, full_input, search_context, target_length=target_length)
+                    # Generate Prompt (chat messages with a stable system prefix when use_chat is on)
+                    prompt = build_prompt(character_config, full_input, search_context, config)
                 
-                # Call LLM
-                response = client.generate_text(prompt)
-                
-                st.success("生成完了！")
                 st.markdown("### 生成結果")
-                st.code(response, language=None)
+                if candidate_count > 1:
+                    # Several candidates at once, ranked; each tab has its own copy button
+                    with timed(timings, "generation"):
+                        candidates = generate_candidates(client, prompt, character_config, candidate_count, options,
+                                                         response_cache, target_length=config.get("target_length", 300),
+                                                         deadline=deadline,
+                                                         length_budget=length_target(config) is not None)
+                    result = candidates[0].result
+                    tabs = st.tabs([f"候補{rank} (スコア {candidate.scores['total']:.2f})" for rank, candidate in enumerate(candidates, 1)])
+                    for tab, candidate in zip(tabs, candidates):
+                        with tab:
+                            st.code(candidate.result.text, language=None)
+                            st.caption(f"長さ {candidate.scores['length']:.2f} / キャラらしさ {candidate.scores['character']:.2f} / "
+                                       f"形式 {candidate.scores['format']:.2f} (seed {candidate.seed})")
+                else:
+                    # Call LLM (render tokens as they arrive)
+                    placeholder = st.empty()
+                    streamed = []
+
+                    def render(token):
+                        streamed.append(token)
+                        placeholder.code("".join(streamed), language=None)
+
+                    with timed(timings, "generation"):
+                        result = generate_message(client, prompt, options, response_cache, on_token=render,
+                                                  deadline=deadline, target_length=length_target(config))
+                
+                st.success("生成完了！（キャッシュから取得）" if result.cached else "生成完了！")
+                if response_cache is not None:
+                    st.caption(f"レスポンスキャッシュのヒット率: {response_cache.hit_rate():.0%}")
+
+                metrics = build_metrics(result, timings, endpoints=client.endpoint_stats() if len(client.endpoints) > 1 else None)
+                with st.expander("メトリクス 📊", expanded=False):
+                    st.json(metrics)
+                if config.get("metrics_log"):
+                    append_metrics_log(config["metrics_log"], dict(metrics, command=message_type, character=char_name))
                 
             except Exception as e:
                 st.error(f"エラーが発生しました: {e}")
@@ -0,0 +1,165 @@
+import json
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Iterable, Iterator, List, Optional, Set
+
+def iter_jsonl_jobs(path: str) -> Iterator[dict]:
+    """
+    Reads jobs from a JSONL file. Each line needs an "input" and may set
+    "id", "command" ("pr" / "merge") and "character". A malformed line
+    becomes a job with an "error" (id: its line number), which run_batch
+    records as failed without stopping the run.
+    """
+    with open(path, "r", encoding='utf-8') as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                job = json.loads(line)
+            except ValueError as e:
+                yield {"id": str(line_no), "error": f"Invalid JSON on line {line_no}: {e}"}
+                continue
+            if not isinstance(job, dict):
+                yield {"id": str(line_no), "error": f"Line {line_no} is not a JSON object"}
+                continue
+            job["id"] = str(job.get("id", line_no))
+            yield job
+
+def iter_dir_jobs(path: str) -> Iterator[dict]:
+    """Reads one job per file in a directory of diffs, using the file name as id."""
+    for name in sorted(os.listdir(path)):
+        file_path = os.path.join(path, name)
+        if not os.path.isfile(file_path):
+            continue
+        with open(file_path, "r", encoding='utf-8', errors='replace') as f:
+            yield {"id": name, "input": f.read()}
+
+def _git(repo: str, *args: str) -> str:
+    return subprocess.run(["git", "-C", repo, *args], check=True, capture_output=True,
+                          text=True, encoding='utf-8', errors='replace').stdout
+
+def iter_git_jobs(rev_range: str, repo: str = ".") -> Iterator[dict]:
+    """
+    Yields one job per commit in a `git log` range. The input is the commit
+    message followed by the diff against its first parent, so merge commits
+    describe everything their branch brought in. The range is resolved
+    right away: an invalid range or repo raises ValueError here, before any
+    output is written.
+    """
+    try:
+        shas = _git(repo, "log", "--format=%H", rev_range).split()
+    except subprocess.CalledProcessError as e:
+        raise ValueError(f"git log {rev_range} failed: {e.stderr.strip()}") from e
+    except OSError as e:
+        raise ValueError(f"Could not run git: {e}") from e
+    return _iter_commit_jobs(repo, shas)
+
+def _iter_commit_jobs(repo: str, shas: List[str]) -> Iterator[dict]:
+    for sha in shas:
+        message = _git(repo, "log", "-1", "--format=%B", sha).strip()
+        try:
+            diff = _git(repo, "diff", f"{sha}^1", sha)
+        except subprocess.CalledProcessError:
+            # Root commit: no parent to diff against
+            diff = _git(repo, "show", "--format=", sha)
+        yield {"id": sha, "input": f"{message}\n\n{diff}"}
+
+def load_done_ids(output_path: str) -> Set[str]:
+    """Returns the ids already written successfully to an output file, for resuming."""
+    done = set()
+    try:
+        with open(output_path, "r", encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # A torn last line from an interrupted run
+                    continue
+                if not record.get("error"):
+                    done.add(record.get("id"))
+    except FileNotFoundError:
+        pass
+    return done
+
+def run_batch(jobs: Iterable[dict], generate: Callable[[dict], dict], output_path: Optional[str] = None,
+              workers: int = 4, ordered: bool = False, resume: bool = False) -> dict:
+    """
+    Runs `generate` over `jobs` on a bounded worker pool and streams one JSON
+    record per job to `output_path` (stdout if omitted). With `ordered`, records
+    are written in input order; otherwise as soon as they finish. With `resume`,
+    jobs whose id already has a successful record are skipped.
+    """
+    done_ids = load_done_ids(output_path) if resume and output_path else set()
+    out = open(output_path, "a" if resume else "w", encoding='utf-8') if output_path else sys.stdout
+    if resume and output_path and out.tell() > 0:
+        with open(output_path, "rb") as f:
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b"\n":
+                # Terminate a torn last line from an interrupted run so the next record starts on its own line
+                out.write("\n")
+    stats = {"done": 0, "failed": 0, "skipped": 0}
+    start = time.monotonic()
+
+    def run_job(job: dict) -> dict:
+        job_start = time.monotonic()
+        record = {"id": job["id"]}
+        try:
+            if job.get("error"):
+                # A job the source could not read (e.g. a malformed JSONL line)
+                raise Exception(job["error"])
+            record.update(generate(job))
+        except Exception as e:
+            record["error"] = str(e)
+        record["elapsed"] = round(time.monotonic() - job_start, 3)
+        return record
+
+    def write(record: dict):
+        out.write(json.dumps(record, ensure_ascii=False) + "\n")
+        out.flush()
+        stats["failed" if record.get("error") else "done"] += 1
+        elapsed = time.monotonic() - start
+        rate = stats["done"] / elapsed * 60 if elapsed > 0 else 0.0
+        print(f"[batch] {stats['done']} done, {stats['failed']} failed, {rate:.1f} messages/min",
+              file=sys.stderr, flush=True)
+
+    # Keep at most two jobs per worker in flight so huge sources are streamed, not loaded
+    max_in_flight = max(1, workers) * 2
+    in_flight = []
+
+    def collect(block: bool):
+        """Writes every finished record (in input order if `ordered`); with `block`, waits for at least one."""
+        if ordered:
+            while in_flight and (in_flight[0].done() or block):
+                write(in_flight.pop(0).result())
+                block = False
+            return
+        finished = [future for future in in_flight if future.done()]
+        if not finished and block:
+            finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+        for future in finished:
+            in_flight.remove(future)
+            write(future.result())
+
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            for job in jobs:
+                if job["id"] in done_ids:
+                    stats["skipped"] += 1
+                    continue
+                in_flight.append(executor.submit(run_job, job))
+                collect(block=len(in_flight) >= max_in_flight)
+            while in_flight:
+                collect(block=True)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+    elapsed = time.monotonic() - start
+    stats["elapsed"] = round(elapsed, 3)
+    # Only successful messages count as throughput; failures are reported separately
+    stats["messages_per_min"] = round(stats["done"] / elapsed * 60, 2) if elapsed > 0 else 0.0
+    return stats
@@ -0,0 +1,238 @@
+import hashlib
+import json
+import os
+import sys
+import threading
+from typing import Iterator, List, Optional
+
+STORE_PATH = os.path.join(os.path.dirname(__file__), "characters.sqlite3")
+
+# Columns of their own; any other keys of a character are kept as JSON in `extra`
+FIELDS = ("name", "work", "description")
+
+def default_store_path(config_path: str) -> str:
+    """
+    The store for a config file: characters.sqlite3 next to a config.json,
+    <name>.characters.sqlite3 next to any other <name>.json, so every config
+    keeps its own characters.
+    """
+    directory, file_name = os.path.split(os.path.abspath(config_path))
+    stem = os.path.splitext(file_name)[0]
+    return os.path.join(directory, "characters.sqlite3" if stem == "config" else f"{stem}.characters.sqlite3")
+
+def _like_pattern(query: str) -> str:
+    """A LIKE pattern (used with ESCAPE '\\') matching `query` literally anywhere in the value."""
+    escaped = query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+class CharacterStore:
+    """
+    Character catalog stored in SQLite, with case-insensitive indexes on name
+    and work so lookups, searches and single-character edits stay fast with
+    thousands of personas (config.json holds them as one list that has to be
+    scanned and rewritten whole).
+
+    Characters are dicts like the entries of config.json's "characters", plus
+    their `id`. Their order (for index selectors like `--character 2`) is the
+    order they were added in.
+    """
+
+    def __init__(self, path: str = STORE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        # Imported on first use so commands that need no characters do not load sqlite3
+        import sqlite3
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS characters (
+                id INTEGER PRIMARY KEY,
+                name TEXT NOT NULL COLLATE NOCASE,
+                work TEXT NOT NULL DEFAULT '' COLLATE NOCASE,
+                description TEXT NOT NULL DEFAULT '',
+                extra TEXT NOT NULL DEFAULT '{}'
+            );
+            CREATE INDEX IF NOT EXISTS characters_name ON characters (name);
+            CREATE INDEX IF NOT EXISTS characters_work ON characters (work);
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+        """)
+        self._conn.commit()
+
+    @classmethod
+    def from_config(cls, config: dict, config_path: Optional[str] = None) -> "CharacterStore":
+        """
+        Opens the store at `character_store_path`, by default the one for
+        `config_path` (see default_store_path), and syncs it with the config's
+        characters (see sync_config).
+        """
+        path = config.get("character_store_path") or (default_store_path(config_path) if config_path else STORE_PATH)
+        store = cls(path)
+        store.sync_config(config)
+        return store
+
+    def sync_config(self, config: dict) -> int:
+        """
+        Imports the config's `characters` into the store when they changed
+        since the last import (or the store is new), so edits to config.json
+        take effect; edits made in the store alone are kept otherwise.
+        Returns the number imported.
+        """
+        characters = config.get("characters") or []
+        fingerprint = hashlib.sha256(json.dumps(characters, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = 'config_characters'").fetchone()
+        seen = row["value"] if row else None
+        if seen == fingerprint:
+            return 0
+        imported = 0
+        if seen is None and self.count():
+            # A store from before imports were recorded: take it as in sync with the config
+            pass
+        elif characters:
+            imported = self.import_characters(characters)
+            if seen is not None:
+                print(f"Characters in the config changed: re-imported {imported} into {self.path}", file=sys.stderr)
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('config_characters', ?)", (fingerprint,))
+            self._conn.commit()
+        return imported
+
+    @staticmethod
+    def _to_dict(row) -> dict:
+        character = {"id": row["id"], "name": row["name"], "work": row["work"], "description": row["description"]}
+        character.update(json.loads(row["extra"]))
+        return character
+
+    @staticmethod
+    def _to_row(character: dict) -> tuple:
+        extra = {key: value for key, value in character.items() if key not in FIELDS and key != "id"}
+        return (character.get("name", ""), character.get("work", ""), character.get("description", ""),
+                json.dumps(extra, ensure_ascii=False))
+
+    def count(self, query: str = "") -> int:
+        """Number of characters whose name or work contains `query` (all of them if empty)."""
+        with self._lock:
+            if not query:
+                return self._conn.execute("SELECT COUNT(*) FROM characters").fetchone()[0]
+            pattern = _like_pattern(query)
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM characters WHERE name LIKE ? ESCAPE '\\' OR work LIKE ? ESCAPE '\\'",
+                (pattern, pattern)).fetchone()[0]
+
+    def search(self, query: str = "", offset: int = 0, limit: int = 50) -> List[dict]:
+        """One page of the characters whose name or work contains `query`, in catalog order."""
+        with self._lock:
+            if query:
+                pattern = _like_pattern(query)
+                rows = self._conn.execute(
+                    "SELECT * FROM characters WHERE name LIKE ? ESCAPE '\\' OR work LIKE ? ESCAPE '\\' "
+                    "ORDER BY id LIMIT ? OFFSET ?",
+                    (pattern, pattern, limit, offset)).fetchall()
+            else:
+                rows = self._conn.execute("SELECT * FROM characters ORDER BY id LIMIT ? OFFSET ?",
+                                          (limit, offset)).fetchall()
+        return [self._to_dict(row) for row in rows]
+
+    def __iter__(self) -> Iterator[dict]:
+        with self._lock:
+            rows = self._conn.execute("SELECT * FROM characters ORDER BY id").fetchall()
+        return (self._to_dict(row) for row in rows)
+
+    def get(self, character_id: int) -> Optional[dict]:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM characters WHERE id = ?", (character_id,)).fetchone()
+        return self._to_dict(row) if row else None
+
+    def find_by_name(self, name: str, work: Optional[str] = None) -> Optional[dict]:
+        """The first character with this name (case-insensitive), optionally also matching `work`."""
+        with self._lock:
+            if work is None:
+                row = self._conn.execute("SELECT * FROM characters WHERE name = ? ORDER BY id LIMIT 1",
+                                         (name,)).fetchone()
+            else:
+                row = self._conn.execute("SELECT * FROM characters WHERE name = ? AND work = ? ORDER BY id LIMIT 1",
+                                         (name, work)).fetchone()
+        return self._to_dict(row) if row else None
+
+    def at(self, position: int) -> Optional[dict]:
+        """The character at `position` in catalog order."""
+        if position < 0:
+            return None
+        page = self.search(offset=position, limit=1)
+        return page[0] if page else None
+
+    def active(self, config: dict) -> Optional[dict]:
+        """
+        The active character: `active_character_id` in config, else the one at
+        `active_character_index` (the config.json-era setting), else the first.
+        """
+        character = None
+        if config.get("active_character_id") is not None:
+            character = self.get(config["active_character_id"])
+        if character is None:
+            character = self.at(config.get("active_character_index", 0)) or self.at(0)
+        return character
+
+    def add(self, character: dict) -> int:
+        """Inserts a character and returns its id."""
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO characters (name, work, description, extra) VALUES (?, ?, ?, ?)",
+                self._to_row(character))
+            self._conn.commit()
+            return cursor.lastrowid
+
+    def update(self, character_id: int, changes: dict) -> bool:
+        """Applies `changes` to one character; returns False if it does not exist."""
+        character = self.get(character_id)
+        if character is None:
+            return False
+        character.update(changes)
+        with self._lock:
+            self._conn.execute("UPDATE characters SET name = ?, work = ?, description = ?, extra = ? WHERE id = ?",
+                               self._to_row(character) + (character_id,))
+            self._conn.commit()
+        return True
+
+    def delete(self, character_id: int) -> bool:
+        with self._lock:
+            cursor = self._conn.execute("DELETE FROM characters WHERE id = ?", (character_id,))
+            self._conn.commit()
+            return cursor.rowcount > 0
+
+    def import_characters(self, characters: List[dict], replace: bool = False) -> int:
+        """
+        Adds characters in config.json's format in one transaction. A character
+        with the same name and work as an existing one updates it instead.
+        `replace` empties the store first. Returns the number imported.
+        """
+        with self._lock:
+            if replace:
+                self._conn.execute("DELETE FROM characters")
+            for character in characters:
+                row = self._to_row(character)
+                existing = self._conn.execute("SELECT id FROM characters WHERE name = ? AND work = ? LIMIT 1",
+                                              row[:2]).fetchone()
+                if existing:
+                    self._conn.execute(
+                        "UPDATE characters SET name = ?, work = ?, description = ?, extra = ? WHERE id = ?",
+                        row + (existing["id"],))
+                else:
+                    self._conn.execute("INSERT INTO characters (name, work, description, extra) VALUES (?, ?, ?, ?)",
+                                       row)
+            self._conn.commit()
+        return len(characters)
+
+    def export_characters(self) -> List[dict]:
+        """All characters in config.json's format (without ids)."""
+        characters = []
+        for character in self:
+            del character["id"]
+            characters.append(character)
+        return characters
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
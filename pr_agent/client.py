@@ -1,38 +1,589 @@
-import urllib.request
-import urllib.error
+import http.client
 import json
-from typing import Optional
+import random
+import socket
+import threading
+import time
+import urllib.parse
+from dataclasses import asdict, dataclass
+from typing import Iterator, List, Optional, Tuple
 
-class OllamaClient:
-    def __init__(self, api_url: str = "http://localhost:11434/api/generate", model: str = "llama3"):
+# Timing fields Ollama reports on the final response (durations in nanoseconds)
+OLLAMA_METRIC_FIELDS = (
+    "total_duration", "load_duration", "prompt_eval_count",
+    "prompt_eval_duration", "eval_count", "eval_duration",
+)
+
+@dataclass
+class GenerationResult:
+    """A generated text together with Ollama's eval metrics and client-side timings."""
+    text: str = ""
+    model: str = ""
+    total_duration: Optional[int] = None
+    load_duration: Optional[int] = None
+    prompt_eval_count: Optional[int] = None
+    prompt_eval_duration: Optional[int] = None
+    eval_count: Optional[int] = None
+    eval_duration: Optional[int] = None
+    # Client-side: which endpoint served the request, the full HTTP round trip
+    # and time to first streamed token, in seconds
+    endpoint: Optional[str] = None
+    http_seconds: Optional[float] = None
+    first_token_seconds: Optional[float] = None
+    cached: bool = False
+    # The client closed the stream at target_length, before Ollama's final chunk
+    stopped_early: bool = False
+    # Number of streamed chunks (one token each), counted by the client; the
+    # only token count for a stream closed before Ollama reports eval_count
+    streamed_tokens: Optional[int] = None
+
+    def update_from_response(self, data: dict):
+        for name in OLLAMA_METRIC_FIELDS:
+            if name in data:
+                setattr(self, name, data[name])
+
+    def tokens_per_second(self) -> Optional[float]:
+        if self.eval_count and self.eval_duration:
+            return self.eval_count / (self.eval_duration / 1e9)
+        return None
+
+    def to_dict(self, include_text: bool = False) -> dict:
+        data = asdict(self)
+        if not include_text:
+            data.pop("text")
+        data["tokens_per_second"] = self.tokens_per_second()
+        return data
+
+# Errors from a keep-alive connection the server closed while it sat idle in
+# the pool; the request never reached Ollama and is safe to resend
+STALE_CONNECTION_ERRORS = (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError)
+
+class ConnectionPool:
+    """A small pool of keep-alive HTTP connections to a single host."""
+
+    def __init__(self, base_url: str, maxsize: int = 4, timeout: Optional[float] = None):
+        parsed = urllib.parse.urlsplit(base_url)
+        self.scheme = parsed.scheme or "http"
+        self.host = parsed.hostname or "localhost"
+        self.port = parsed.port
+        self.maxsize = max(1, maxsize)
+        self.timeout = timeout
+        self._idle: List[http.client.HTTPConnection] = []
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def _new_connection(self) -> http.client.HTTPConnection:
+        if self.scheme == "https":
+            return http.client.HTTPSConnection(self.host, self.port, timeout=self.timeout)
+        return http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+
+    def acquire(self):
+        """Returns (connection, reused) - an idle connection if one is available."""
+        with self._lock:
+            if self._idle:
+                return self._idle.pop(), True
+        return self._new_connection(), False
+
+    def release(self, conn: http.client.HTTPConnection):
+        """Returns a connection whose response has been fully read to the pool."""
+        with self._lock:
+            if not self._closed and len(self._idle) < self.maxsize:
+                self._idle.append(conn)
+                return
+        conn.close()
+
+    def close(self):
+        """Closes the idle connections; ones still in use are closed when released."""
+        with self._lock:
+            self._closed = True
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+    def fetch(self, method: str, path: str, timeout: Optional[float] = None) -> Tuple[int, bytes]:
+        """
+        Sends a small request over a pooled keep-alive connection and returns
+        (status, body). `timeout` applies to this request only. A connection
+        the server dropped while idle is replaced once.
+        """
+        while True:
+            conn, reused = self.acquire()
+            try:
+                conn.timeout = timeout
+                if conn.sock is not None:
+                    conn.sock.settimeout(timeout)
+                conn.request(method, path)
+                response = conn.getresponse()
+                body = response.read()
+            except STALE_CONNECTION_ERRORS:
+                conn.close()
+                if reused:
+                    continue
+                raise
+            except (http.client.HTTPException, OSError):
+                conn.close()
+                raise
+            # Back to the pool's own timeout for the next request on this connection
+            conn.timeout = self.timeout
+            if conn.sock is not None:
+                conn.sock.settimeout(self.timeout)
+            if response.will_close:
+                conn.close()
+            else:
+                self.release(conn)
+            return response.status, body
+
+# `"num_ctx": "auto"` sizes the context window to the prompt: at least this many
+# tokens, with room for the template and chat markup on top of the estimate
+MIN_AUTO_NUM_CTX = 2048
+CONTEXT_MARGIN_TOKENS = 256
+
+# config.json keys that OllamaClient.from_config reads; long-lived processes
+# rebuild their client when one of these changes
+CLIENT_CONFIG_KEYS = ("api_url", "endpoints", "model", "pool_size", "timeout", "keep_alive",
+                      "health_check_interval", "health_timeout", "retries", "retry_backoff")
+
+class DeadlineExceeded(Exception):
+    """The request's deadline passed before Ollama finished."""
+
+class Endpoint:
+    """One Ollama server: its connection pool, health and load as seen by this client."""
+
+    # Weight of the newest sample in the latency moving average
+    LATENCY_ALPHA = 0.3
+
+    def __init__(self, api_url: str, models: Optional[List[str]] = None, pool_size: int = 4,
+                 timeout: Optional[float] = None):
         self.api_url = api_url
+        # Models this endpoint serves; None means unknown (filled in by health checks)
+        self.models = list(models) if models is not None else None
+        self._static_models = models is not None
+        path = urllib.parse.urlsplit(api_url).path or "/api/generate"
+        self.generate_path = path
+        # /api/chat and /api/tags live next to /api/generate (also behind a path-prefixed proxy)
+        self.chat_path = path.rsplit("/", 1)[0] + "/chat"
+        self.tags_path = path.rsplit("/", 1)[0] + "/tags"
+        self.pool = ConnectionPool(api_url, maxsize=pool_size, timeout=timeout)
+        self.healthy = True
+        self.in_flight = 0
+        self.requests = 0
+        self.failures = 0
+        self.latency: Optional[float] = None
+        self.ping: Optional[float] = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, entry, pool_size: int = 4, timeout: Optional[float] = None) -> "Endpoint":
+        """Accepts either an api_url string or {"api_url": ..., "models": [...]}."""
+        if isinstance(entry, str):
+            return cls(entry, pool_size=pool_size, timeout=timeout)
+        return cls(entry["api_url"], models=entry.get("models"), pool_size=entry.get("pool_size", pool_size),
+                   timeout=timeout)
+
+    def serves(self, model: str) -> bool:
+        if self.models is None:
+            return True
+        return model in self.models or f"{model}:latest" in self.models
+
+    def begin(self):
+        with self._lock:
+            self.in_flight += 1
+            self.requests += 1
+
+    def end(self, seconds: Optional[float] = None, failed: bool = False):
+        with self._lock:
+            self.in_flight -= 1
+            if failed:
+                self.failures += 1
+                self.healthy = False
+            elif seconds is not None:
+                self.healthy = True
+                self.latency = seconds if self.latency is None else (
+                    self.LATENCY_ALPHA * seconds + (1 - self.LATENCY_ALPHA) * self.latency)
+
+    def load(self) -> tuple:
+        """Sort key for routing: fewest requests in flight, then fastest to answer a health check."""
+        return (self.in_flight, self.ping if self.ping is not None else float("inf"))
+
+    def check(self, timeout: float = 2) -> bool:
+        """Fetches /api/tags, updating health, ping latency and (unless configured) the model list."""
+        start = time.perf_counter()
+        try:
+            # Over the keep-alive pool, so a per-request check costs no new TCP/TLS handshake
+            status, raw = self.pool.fetch("GET", self.tags_path, timeout=timeout)
+            healthy = status == 200
+            if healthy and not self._static_models:
+                self.models = [model["name"] for model in json.loads(raw.decode('utf-8')).get("models", [])]
+        except (http.client.HTTPException, OSError, ValueError):
+            healthy = False
+        with self._lock:
+            self.healthy = healthy
+            self.ping = time.perf_counter() - start if healthy else None
+        return healthy
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "api_url": self.api_url,
+                "healthy": self.healthy,
+                "in_flight": self.in_flight,
+                "requests": self.requests,
+                "failures": self.failures,
+                "latency_ms": round(self.latency * 1000, 1) if self.latency is not None else None,
+                "ping_ms": round(self.ping * 1000, 1) if self.ping is not None else None,
+                "models": self.models,
+            }
+
+
+class OllamaClient:
+    """
+    Talks to one or more Ollama servers. With several endpoints, each request
+    goes to the least-loaded healthy endpoint that serves the model, and fails
+    over to the next one on connection errors or 5xx responses. When every
+    endpoint failed, the round is retried up to `retries` times with jittered
+    exponential backoff. A timed-out request is never resent: Ollama may
+    still be generating it.
+
+    Request methods take an optional `deadline` (a time.monotonic() value):
+    socket timeouts are capped to the time left, no retry starts that cannot
+    finish in time, and a stream that runs past it is cut off with DeadlineExceeded.
+    """
+
+    def __init__(self, api_url: str = "http://localhost:11434/api/generate", model: str = "llama3",
+                 pool_size: int = 4, timeout: Optional[float] = None, keep_alive=None,
+                 endpoints: Optional[list] = None, retries: int = 2, retry_backoff: float = 0.5):
         self.model = model
+        self.timeout = timeout
+        self.retries = max(0, retries)
+        self.retry_backoff = retry_backoff
+        # How long Ollama keeps the model loaded after a request (e.g. "30m", or -1 for forever)
+        self.keep_alive = keep_alive
+        self.endpoints = [Endpoint.from_config(entry, pool_size=pool_size, timeout=timeout)
+                          for entry in (endpoints or [api_url])]
+        self.api_url = self.endpoints[0].api_url
+        self._health_stop = threading.Event()
+        self._health_thread = None
 
-    def generate_text(self, prompt: str, model: Optional[str] = None) -> str:
-        """Generates text using the Ollama API."""
-        payload = {
-            "model": model or self.model,
-            "prompt": prompt,
-            "stream": False
-        }
-        
+    @classmethod
+    def from_config(cls, config: dict) -> "OllamaClient":
+        client = cls(
+            api_url=config.get("api_url", "http://localhost:11434/api/generate"),
+            model=config["model"],
+            pool_size=config.get("pool_size", 4),
+            timeout=config.get("timeout"),
+            keep_alive=config.get("keep_alive"),
+            endpoints=config.get("endpoints"),
+            retries=config.get("retries", 2),
+            retry_backoff=config.get("retry_backoff", 0.5),
+        )
+        interval = config.get("health_check_interval", 30)
+        if len(client.endpoints) > 1 and interval:
+            client.start_health_checks(interval, timeout=config.get("health_timeout", 2))
+        return client
+
+    @property
+    def api_urls(self) -> List[str]:
+        return [endpoint.api_url for endpoint in self.endpoints]
+
+    def _candidates(self, model: str) -> List[Endpoint]:
+        """Endpoints that serve `model`, healthy ones first, each group ordered by load."""
+        serving = [endpoint for endpoint in self.endpoints if endpoint.serves(model)] or list(self.endpoints)
+        return sorted(serving, key=lambda endpoint: (not endpoint.healthy, endpoint.load()))
+
+    def _send(self, endpoint: Endpoint, method: str, path: str, body: Optional[bytes], deadline: Optional[float]):
+        """Sends a request over a pooled connection and returns (connection, response)."""
+        headers = {"Content-Type": "application/json"} if body is not None else {}
+        while True:
+            # Recomputed per attempt so a retry never runs past the deadline
+            timeout = self._timeout(deadline)
+            conn, reused = endpoint.pool.acquire()
+            try:
+                conn.timeout = timeout
+                if conn.sock is not None:
+                    conn.sock.settimeout(timeout)
+                conn.request(method, path, body=body, headers=headers)
+                return conn, conn.getresponse()
+            except STALE_CONNECTION_ERRORS:
+                conn.close()
+                # The server may have dropped an idle keep-alive connection; retry on a fresh one
+                if reused:
+                    continue
+                raise
+            except (http.client.HTTPException, OSError):
+                # Timeouts included: the request may be running on the server, so it is not resent here
+                conn.close()
+                raise
+
+    def _timeout(self, deadline: Optional[float]) -> Optional[float]:
+        """The socket timeout for the next request: `timeout`, capped to the time left before `deadline`."""
+        if deadline is None:
+            return self.timeout
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise DeadlineExceeded("Deadline exceeded before Ollama answered")
+        return min(self.timeout, remaining) if self.timeout else remaining
+
+    def _backoff(self, attempt: int, deadline: Optional[float]):
+        """Sleeps before retry `attempt` + 1: a random delay up to retry_backoff * 2^attempt ("full jitter")."""
+        delay = random.uniform(0, self.retry_backoff * 2 ** attempt)
+        if deadline is not None and time.monotonic() + delay >= deadline:
+            raise DeadlineExceeded("Deadline exceeded while retrying Ollama")
+        time.sleep(delay)
+
+    def _request(self, payload: dict, chat: bool, deadline: Optional[float] = None,
+                 candidates: Optional[List[Endpoint]] = None):
+        """
+        POSTs to the best endpoint for the payload's model and returns
+        (endpoint, connection, response). Connection errors and 5xx responses
+        move on to the next candidate, then to another round after a backoff;
+        the outcome of the very last attempt is returned or raised. A timeout
+        is raised right away.
+        """
+        body = json.dumps(payload).encode('utf-8')
+        for attempt in range(self.retries + 1):
+            if attempt:
+                self._backoff(attempt - 1, deadline)
+            order = candidates or self._candidates(payload["model"])
+            for index, endpoint in enumerate(order):
+                last = attempt == self.retries and index == len(order) - 1
+                path = endpoint.chat_path if chat else endpoint.generate_path
+                endpoint.begin()
+                try:
+                    conn, response = self._send(endpoint, "POST", path, body, deadline)
+                except socket.timeout:
+                    # Slow, not down: the endpoint stays healthy and the request is not resent
+                    endpoint.end()
+                    raise
+                except (http.client.HTTPException, OSError):
+                    endpoint.end(failed=True)
+                    if last:
+                        raise
+                    continue
+                except DeadlineExceeded:
+                    endpoint.end()
+                    raise
+                if response.status >= 500 and not last:
+                    response.read()
+                    self._finish(endpoint, conn, response, failed=True)
+                    continue
+                return endpoint, conn, response
+
+    def _finish(self, endpoint: Endpoint, conn: http.client.HTTPConnection, response: http.client.HTTPResponse,
+                seconds: Optional[float] = None, failed: bool = False):
+        """Hands the connection back to the pool once the response is consumed."""
+        endpoint.end(seconds, failed=failed or response.status >= 500)
+        if response.isclosed() and not response.will_close:
+            endpoint.pool.release(conn)
+        else:
+            conn.close()
+
+    @staticmethod
+    def _context_size(options: dict, fields: dict) -> int:
+        """
+        num_ctx for `"num_ctx": "auto"`: the prompt estimate plus num_predict,
+        rounded up to a power of two (at least 2048) so that Ollama, which
+        reloads the model when num_ctx changes, only sees a few sizes.
+        """
+        # Imported here: pr_agent.diff imports this module
+        from pr_agent.diff import estimate_tokens
+
+        prompt = fields.get("prompt") or "".join(message.get("content", "") for message in fields.get("messages", []))
+        needed = estimate_tokens(prompt) + max(0, options.get("num_predict") or 0) + CONTEXT_MARGIN_TOKENS
+        num_ctx = MIN_AUTO_NUM_CTX
+        while num_ctx < needed:
+            num_ctx *= 2
+        return num_ctx
+
+    def _payload(self, model: Optional[str], options: Optional[dict], stream: bool, **fields) -> dict:
+        payload = {"model": model or self.model, **fields, "stream": stream}
+        if options and options.get("num_ctx") == "auto":
+            options = dict(options, num_ctx=self._context_size(options, fields))
+        if options:
+            payload["options"] = options
+        if self.keep_alive is not None:
+            payload["keep_alive"] = self.keep_alive
+        return payload
+
+    @staticmethod
+    def _chunk_text(data: dict) -> str:
+        # /api/generate puts text in "response", /api/chat in "message.content"
+        text = data.get("response")
+        if text is None:
+            text = data.get("message", {}).get("content", "")
+        # Sanitize output: Replace full-width space (which may render as <0xE3><0x80><0x80>) with normal space
+        return text.replace("\u3000", " ")
+
+    @staticmethod
+    def _raise_connection_error(error: Exception, deadline: Optional[float]):
+        if deadline is not None and time.monotonic() >= deadline:
+            # The socket timeout was capped to the deadline
+            raise DeadlineExceeded(f"Deadline exceeded while waiting for Ollama ({error})") from error
+        if isinstance(error, socket.timeout):
+            raise Exception(f"Timed out waiting for Ollama ({error}); raise `timeout` in config.json for slow models") from error
+        raise Exception(f"Failed to connect to Ollama: {str(error)}\nMake sure Ollama is running (e.g., 'ollama serve')")
+
+    def _complete(self, payload: dict, chat: bool = False, candidates: Optional[List[Endpoint]] = None,
+                  deadline: Optional[float] = None) -> GenerationResult:
+        start = time.perf_counter()
         try:
-            data = json.dumps(payload).encode('utf-8')
-            req = urllib.request.Request(self.api_url, data=data, headers={"Content-Type": "application/json"})
-            with urllib.request.urlopen(req) as response:
-                result = json.loads(response.read().decode('utf-8'))
-                text = result.get("response", "")
-                # Sanitize output: Replace full-width space (which may render as <0xE3><0x80><0x80>) with normal space
-                return text.replace("\u3000", " ")
-        except urllib.error.URLError as e:
-            raise Exception(f"Failed to connect to Ollama: {str(e)}\nMake sure Ollama is running (e.g., 'ollama serve')")
-
-    def check_connection(self) -> bool:
-        """Checks if Ollama is running."""
+            endpoint, conn, response = self._request(payload, chat, deadline=deadline, candidates=candidates)
+            failed = False
+            try:
+                raw = response.read()
+            except (http.client.HTTPException, OSError):
+                failed = True
+                raise
+            finally:
+                self._finish(endpoint, conn, response, time.perf_counter() - start, failed=failed)
+            if response.status != 200:
+                raise Exception(f"Ollama returned HTTP {response.status} from {endpoint.api_url}: {raw.decode('utf-8', 'replace')}")
+            data = json.loads(raw.decode('utf-8'))
+        except (http.client.HTTPException, OSError) as e:
+            self._raise_connection_error(e, deadline)
+
+        result = GenerationResult(model=payload["model"], endpoint=endpoint.api_url,
+                                  http_seconds=time.perf_counter() - start)
+        result.update_from_response(data)
+        result.text = self._chunk_text(data)
+        return result
+
+    def _stream(self, payload: dict, result: Optional[GenerationResult], chat: bool = False,
+                deadline: Optional[float] = None) -> Iterator[str]:
+        """
+        Yields tokens as they arrive. Closing the generator early (or an
+        exception in the consumer) closes the connection, which makes Ollama
+        stop generating.
+        """
+        if result is not None:
+            result.model = payload["model"]
+
+        start = time.perf_counter()
+        parts = []
         try:
-            # Check the root URL (usually http://localhost:11434/)
-            root_url = self.api_url.replace("/api/generate", "")
-            with urllib.request.urlopen(root_url, timeout=2) as response:
-                return response.status == 200
-        except:
-            return False
+            endpoint, conn, response = self._request(payload, chat, deadline=deadline)
+            if result is not None:
+                result.endpoint = endpoint.api_url
+            failed = False
+            try:
+                if response.status != 200:
+                    raw = response.read()
+                    raise Exception(f"Ollama returned HTTP {response.status} from {endpoint.api_url}: {raw.decode('utf-8', 'replace')}")
+                # Ollama streams newline-delimited JSON objects, one per chunk
+                for line in response:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    chunk = json.loads(line.decode('utf-8'))
+                    if "error" in chunk:
+                        raise Exception(f"Ollama returned an error: {chunk['error']}")
+                    text = self._chunk_text(chunk)
+                    if text:
+                        if result is not None and not parts:
+                            result.first_token_seconds = time.perf_counter() - start
+                        parts.append(text)
+                        yield text
+                    if chunk.get("done"):
+                        if result is not None:
+                            result.update_from_response(chunk)
+                        # Drain the terminating chunk so the connection can be reused
+                        response.read()
+                        break
+                    if deadline is not None and time.monotonic() >= deadline:
+                        raise DeadlineExceeded(f"Deadline exceeded after {len(parts)} streamed tokens")
+            except (http.client.HTTPException, OSError):
+                failed = True
+                raise
+            finally:
+                self._finish(endpoint, conn, response, time.perf_counter() - start, failed=failed)
+                if result is not None:
+                    result.text = "".join(parts)
+                    result.streamed_tokens = len(parts)
+                    result.http_seconds = time.perf_counter() - start
+        except (http.client.HTTPException, OSError) as e:
+            self._raise_connection_error(e, deadline)
+
+    def generate(self, prompt: str, model: Optional[str] = None, options: Optional[dict] = None,
+                 deadline: Optional[float] = None) -> GenerationResult:
+        """Generates text using the Ollama API and returns it with the response metrics."""
+        return self._complete(self._payload(model, options, False, prompt=prompt), deadline=deadline)
+
+    def generate_text(self, prompt: str, model: Optional[str] = None, options: Optional[dict] = None,
+                      deadline: Optional[float] = None) -> str:
+        """Generates text using the Ollama API."""
+        return self.generate(prompt, model=model, options=options, deadline=deadline).text
+
+    def generate_stream(self, prompt: str, model: Optional[str] = None, options: Optional[dict] = None,
+                        result: Optional[GenerationResult] = None, deadline: Optional[float] = None) -> Iterator[str]:
+        """
+        Generates text using the Ollama API, yielding tokens as they arrive.
+        If `result` is given, it is filled with the text and metrics once the stream ends.
+        """
+        return self._stream(self._payload(model, options, True, prompt=prompt), result, deadline=deadline)
+
+    def chat(self, messages: List[dict], model: Optional[str] = None, options: Optional[dict] = None,
+             deadline: Optional[float] = None) -> GenerationResult:
+        """
+        Generates a reply via /api/chat. Keeping the system message identical
+        across requests lets Ollama reuse its KV cache for that prefix.
+        """
+        return self._complete(self._payload(model, options, False, messages=messages), chat=True, deadline=deadline)
+
+    def chat_stream(self, messages: List[dict], model: Optional[str] = None, options: Optional[dict] = None,
+                    result: Optional[GenerationResult] = None, deadline: Optional[float] = None) -> Iterator[str]:
+        """Like chat(), yielding tokens as they arrive."""
+        return self._stream(self._payload(model, options, True, messages=messages), result, chat=True,
+                            deadline=deadline)
+
+    def warm_up(self, model: Optional[str] = None) -> GenerationResult:
+        """
+        Loads the model into memory without generating anything (an empty
+        prompt), so the next real request does not pay the model load.
+        Every endpoint serving the model is warmed, since any of them may get
+        the next request. Returns the slowest load.
+        """
+        model = model or self.model
+        payload = self._payload(model, None, False, prompt="")
+        results, error = [], None
+        for endpoint in self._candidates(model):
+            if not endpoint.healthy and len(self.endpoints) > 1:
+                continue
+            try:
+                results.append(self._complete(payload, candidates=[endpoint]))
+            except Exception as e:
+                error = e
+        if not results:
+            raise error or Exception(f"No healthy Ollama endpoint serves {model}")
+        return max(results, key=lambda result: result.load_duration or 0)
+
+    def check_connection(self, timeout: float = 2) -> bool:
+        """Checks if Ollama is running on at least one endpoint (all are checked concurrently)."""
+        if len(self.endpoints) == 1:
+            return self.endpoints[0].check(timeout)
+        threads = [threading.Thread(target=endpoint.check, args=(timeout,), daemon=True) for endpoint in self.endpoints]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(timeout + 1)
+        return any(endpoint.healthy for endpoint in self.endpoints)
+
+    def start_health_checks(self, interval: float = 30, timeout: float = 2):
+        """Re-checks every endpoint every `interval` seconds on a daemon thread."""
+        if self._health_thread is not None:
+            return
+
+        def loop():
+            while not self._health_stop.wait(interval):
+                self.check_connection(timeout)
+
+        self._health_thread = threading.Thread(target=loop, name="ollama-health", daemon=True)
+        self._health_thread.start()
+
+    def endpoint_stats(self) -> List[dict]:
+        """Health, load and latency of every endpoint, for display and metrics."""
+        return [endpoint.stats() for endpoint in self.endpoints]
+
+    def close(self):
+        """Stops health checks and closes all pooled connections."""
+        self._health_stop.set()
+        for endpoint in self.endpoints:
+            endpoint.pool.close()
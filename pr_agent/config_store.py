@@ -0,0 +1,83 @@
+import copy
+import json
+import os
+import threading
+from contextlib import contextmanager
+from typing import Callable, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows: fall back to the in-process lock only
+    fcntl = None
+
+CONFIG_PATH = os.path.join(os.path.dirname(__file__), "config.json")
+
+class ConfigStore:
+    """
+    Keeps the parsed config.json in memory and re-reads it only when the file's
+    mtime or size changes. Updates re-read the latest file under a lock, apply
+    the change, and replace the file atomically (temp file + rename), so
+    concurrent sessions never see a torn file or overwrite each other's edits.
+    """
+
+    def __init__(self, path: str = CONFIG_PATH):
+        self.path = path
+        self._lock = threading.RLock()
+        self._config: Optional[dict] = None
+        self._stamp = None
+
+    def _file_stamp(self):
+        stat = os.stat(self.path)
+        return stat.st_mtime_ns, stat.st_size
+
+    def _read(self) -> dict:
+        stamp = self._file_stamp()
+        if self._config is None or stamp != self._stamp:
+            with open(self.path, "r", encoding='utf-8') as f:
+                self._config = json.load(f)
+            self._stamp = stamp
+        return self._config
+
+    def load(self) -> dict:
+        """Returns a copy of the current config, re-reading the file only if it changed."""
+        with self._lock:
+            return copy.deepcopy(self._read())
+
+    @contextmanager
+    def _file_lock(self):
+        if fcntl is None:
+            yield
+            return
+        with open(self.path + ".lock", "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def mutate(self, mutator: Callable[[dict], None]) -> dict:
+        """Applies `mutator` to the latest config in place and writes it back atomically."""
+        # Imported here: tempfile is slow to load and only needed for writes
+        import tempfile
+
+        with self._lock, self._file_lock():
+            config = copy.deepcopy(self._read())
+            mutator(config)
+            directory = os.path.dirname(os.path.abspath(self.path))
+            fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".config.", suffix=".tmp")
+            try:
+                with os.fdopen(fd, "w", encoding='utf-8') as f:
+                    json.dump(config, f, indent=4, ensure_ascii=False)
+                # mkstemp creates the file as 0600; keep the original permissions
+                os.chmod(tmp_path, os.stat(self.path).st_mode & 0o777)
+                os.replace(tmp_path, self.path)
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
+            self._config = config
+            self._stamp = self._file_stamp()
+            return copy.deepcopy(config)
+
+    def update(self, changes: dict) -> dict:
+        """Sets top-level keys and writes the config back atomically."""
+        return self.mutate(lambda config: config.update(changes))
@@ -0,0 +1,72 @@
+"""
+A resident generator process for git hooks and CI.
+
+`main.py serve` keeps the config, the pooled Ollama client and the caches in
+memory and answers requests on localhost HTTP; `hook.py` forwards to it.
+"""
+import json
+import os
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable
+
+from pr_agent.hook import DEFAULT_HOST, DEFAULT_PORT
+
+class DaemonHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "PRAgentDaemon/1.0"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status: int, payload: dict):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path.rstrip("/") == "/health":
+            self._send_json(200, {"status": "ok", "pid": os.getpid(), "requests": self.server.requests,
+                                  "uptime": round(time.monotonic() - self.server.started, 1)})
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        if self.path.rstrip("/") != "/generate":
+            self._send_json(404, {"error": "not found"})
+            return
+        length = int(self.headers.get("Content-Length", 0))
+        try:
+            request = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError as e:
+            self._send_json(400, {"error": f"Invalid JSON: {e}"})
+            return
+        self.server.requests += 1
+        try:
+            self._send_json(200, self.server.handle(request))
+        except (LookupError, ValueError) as e:
+            self._send_json(400, {"error": str(e)})
+        except Exception as e:
+            self._send_json(500, {"error": str(e)})
+
+def serve(handle: Callable[[dict], dict], host: str = DEFAULT_HOST, port: int = DEFAULT_PORT):
+    """
+    Answers POST /generate by calling `handle(request)` on a worker thread per
+    connection, until interrupted. `handle` raises LookupError/ValueError for
+    bad requests (HTTP 400) and anything else for failures (HTTP 500).
+    """
+    server = ThreadingHTTPServer((host, port), DaemonHandler)
+    server.daemon_threads = True
+    server.handle = handle
+    server.requests = 0
+    server.started = time.monotonic()
+    print(f"Serving on http://{host}:{server.server_address[1]} (pid {os.getpid()})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
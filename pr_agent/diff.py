@@ -0,0 +1,239 @@
+import fnmatch
+import re
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Iterable, Iterator, List, Optional
+
+from pr_agent.client import OllamaClient
+from pr_agent.pipeline import generate_message
+from pr_agent.prompts import DIFF_REDUCE_PROMPT, DIFF_SUMMARY_PROMPT
+from pr_agent.response_cache import ResponseCache
+
+# Files that add prompt tokens without telling the model anything about the change
+SKIP_PATTERNS = [
+    "*package-lock.json", "*yarn.lock", "*pnpm-lock.yaml", "*poetry.lock", "*Pipfile.lock",
+    "*Cargo.lock", "*Gemfile.lock", "*composer.lock", "*go.sum", "*uv.lock",
+    "*.min.js", "*.min.css", "*.map", "*.pb.go", "*_pb2.py",
+    "vendor/*", "*/vendor/*", "node_modules/*", "*/node_modules/*",
+    "third_party/*", "*/third_party/*", "dist/*", "build/*",
+]
+
+HUNK_RE = re.compile(r"^@@ -\d+(?:,(\d+))? \+\d+(?:,(\d+))? @@")
+# "--- a/x.py", "--- /dev/null" or diff -u's "--- x.py<TAB>date", as opposed to a removed "-- ..." line
+OLD_HEADER_RE = re.compile(r"^--- (?:a/|/dev/null|[^\t]*\t)")
+NEW_HEADER_RE = re.compile(r"^\+\+\+ (?:b/|/dev/null|[^\t]*\t)")
+
+@dataclass
+class FileDiff:
+    path: str
+    header: List[str] = field(default_factory=list)
+    hunks: List[List[str]] = field(default_factory=list)
+    binary: bool = False
+
+    def text(self) -> str:
+        return "".join(self.header + [line for hunk in self.hunks for line in hunk])
+
+@dataclass
+class CompactedDiff:
+    files: List[FileDiff]
+    skipped: List[str]
+    # Text before the first file diff (a commit message, or the whole input if it is not a diff)
+    preamble: str = ""
+
+    def text(self) -> str:
+        return self.preamble + "".join(f.text() for f in self.files)
+
+def estimate_tokens(text: str) -> int:
+    """Rough token estimate: ~4 ASCII characters per token, ~1 token per Japanese character."""
+    ascii_chars = sum(1 for c in text if ord(c) < 128)
+    return ascii_chars // 4 + (len(text) - ascii_chars)
+
+def truncate_to_tokens(text: str, limit: int) -> str:
+    """Cuts `text` to roughly `limit` tokens using the same estimate as estimate_tokens."""
+    cost = 0.0
+    for i, c in enumerate(text):
+        cost += 0.25 if ord(c) < 128 else 1
+        if cost > limit:
+            return text[:i] + "\n... (truncated)\n"
+    return text
+
+def should_skip(path: str) -> bool:
+    return any(fnmatch.fnmatch(path, pattern) for pattern in SKIP_PATTERNS)
+
+def _path_from_header(line: str) -> str:
+    # "diff --git a/foo.py b/foo.py" -> "foo.py"
+    parts = line.rstrip("\n").split(" b/", 1)
+    return parts[1] if len(parts) == 2 else line.split()[-1]
+
+def iter_file_diffs(lines: Iterable[str], preamble: Optional[List[str]] = None) -> Iterator[FileDiff]:
+    """
+    Parses a unified diff hunk by hunk, yielding one FileDiff per file as soon
+    as it is complete. Lines before the first file are appended to `preamble`.
+    A hunk ends after the lines its @@ header counts, or earlier at a
+    `diff --git` line or a `--- a/`/`+++ b/` header pair if the diff was truncated.
+    """
+    current: Optional[FileDiff] = None
+    hunk: Optional[List[str]] = None
+    old_left = new_left = 0
+    lines = iter(lines)
+    # A line read ahead to tell a "--- "/"+++ " file header from hunk content
+    pending: Optional[str] = None
+    while True:
+        if pending is not None:
+            line, pending = pending, None
+        else:
+            line = next(lines, None)
+            if line is None:
+                break
+        if hunk is not None and (old_left > 0 or new_left > 0):
+            ends_hunk = line.startswith("diff --git ")
+            if not ends_hunk and OLD_HEADER_RE.match(line):
+                pending = next(lines, None)
+                ends_hunk = pending is not None and NEW_HEADER_RE.match(pending) is not None
+            if ends_hunk:
+                # Truncated hunk (fewer lines than its @@ counts): the next file starts here regardless
+                old_left = new_left = 0
+        if hunk is not None and (old_left > 0 or new_left > 0):
+            # Inside a hunk: count lines so that content like "--- x" is not mistaken for a header
+            hunk.append(line)
+            if line.startswith("-"):
+                old_left -= 1
+            elif line.startswith("+"):
+                new_left -= 1
+            elif not line.startswith("\\"):
+                old_left -= 1
+                new_left -= 1
+            continue
+
+        starts_file = line.startswith("diff --git ") or (
+            line.startswith("--- ") and (current is None or current.hunks))
+        if starts_file:
+            if current is not None:
+                yield current
+            path = _path_from_header(line) if line.startswith("diff --git ") else ""
+            current, hunk = FileDiff(path=path), None
+
+        if current is None:
+            if preamble is not None:
+                preamble.append(line)
+            continue
+
+        match = HUNK_RE.match(line)
+        if match:
+            old_left = int(match.group(1) or 1)
+            new_left = int(match.group(2) or 1)
+            hunk = [line]
+            current.hunks.append(hunk)
+        elif hunk is not None:
+            # "\ No newline at end of file" and similar trailers
+            hunk.append(line)
+        else:
+            if line.startswith("+++ ") and not current.path:
+                current.path = line[4:].strip().split("\t")[0].removeprefix("b/")
+            if line.startswith("Binary files ") or line.startswith("GIT binary patch"):
+                current.binary = True
+            current.header.append(line)
+    if current is not None:
+        yield current
+
+def compact_diff(text: str) -> CompactedDiff:
+    """Drops binaries, lockfiles and vendored paths from a unified diff."""
+    files, skipped, preamble = [], [], []
+    for file_diff in iter_file_diffs(text.splitlines(keepends=True), preamble):
+        if file_diff.binary or should_skip(file_diff.path):
+            skipped.append(file_diff.path)
+        else:
+            files.append(file_diff)
+    return CompactedDiff(files=files, skipped=skipped, preamble="".join(preamble))
+
+def split_chunks(files: List[FileDiff], chunk_tokens: int) -> List[str]:
+    """Packs file diffs into chunks of at most `chunk_tokens`, splitting large files by hunk."""
+    chunks, current, current_tokens = [], [], 0
+
+    def flush():
+        nonlocal current, current_tokens
+        if current:
+            chunks.append("".join(current))
+        current, current_tokens = [], 0
+
+    for file_diff in files:
+        pieces = [file_diff.text()]
+        if estimate_tokens(pieces[0]) > chunk_tokens:
+            header = "".join(file_diff.header)
+            pieces = [header + "".join(hunk) for hunk in file_diff.hunks]
+        for piece in pieces:
+            tokens = estimate_tokens(piece)
+            if tokens > chunk_tokens:
+                # A single oversized hunk: keep its beginning
+                piece = truncate_to_tokens(piece, chunk_tokens)
+                tokens = estimate_tokens(piece)
+            if current_tokens + tokens > chunk_tokens:
+                flush()
+            current.append(piece)
+            current_tokens += tokens
+    flush()
+    return chunks
+
+def _group_summaries(summaries: List[str], limit: int) -> List[List[str]]:
+    """Packs summaries into groups of about `limit` tokens, at least two per group so every round shrinks."""
+    groups, group, group_tokens = [], [], 0
+    for summary in summaries:
+        tokens = estimate_tokens(summary)
+        if len(group) >= 2 and group_tokens + tokens > limit:
+            groups.append(group)
+            group, group_tokens = [], 0
+        group.append(summary)
+        group_tokens += tokens
+    groups.append(group)
+    return groups
+
+def summarize_chunks(client: OllamaClient, chunks: List[str], chunk_tokens: int, workers: int,
+                     options: Optional[dict] = None, cache: Optional[ResponseCache] = None,
+                     deadline: Optional[float] = None) -> str:
+    """Summarizes chunks in parallel (map), then merges the partial summaries (reduce)."""
+    def summarize(prompt: str) -> str:
+        return generate_message(client, prompt, options, cache, deadline=deadline).text.strip()
+
+    def reduce(group: List[str]) -> str:
+        return summarize(DIFF_REDUCE_PROMPT.format(summaries="\n".join(f"- {s}" for s in group)))
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        summaries = list(executor.map(lambda chunk: summarize(DIFF_SUMMARY_PROMPT.format(diff=chunk)), chunks))
+
+        # Too many partial summaries for one reduce call: reduce them in groups first
+        while len(summaries) > 1 and estimate_tokens("\n".join(summaries)) > chunk_tokens:
+            summaries = list(executor.map(reduce, _group_summaries(summaries, chunk_tokens)))
+
+    if len(summaries) == 1:
+        return summaries[0]
+    return reduce(summaries)
+
+def prepare_diff_input(client: OllamaClient, text: str, config: dict,
+                       options: Optional[dict] = None, cache: Optional[ResponseCache] = None,
+                       deadline: Optional[float] = None) -> str:
+    """
+    Compacts a diff for the persona prompt. Inputs within `diff_token_budget`
+    are passed through (minus skipped files); larger ones are summarized chunk
+    by chunk in parallel and then reduced into one summary. `options`,
+    `cache` and `deadline` apply to the summarization calls.
+    """
+    token_budget = config.get("diff_token_budget", 6000)
+    chunk_tokens = config.get("diff_chunk_tokens", 3000)
+    workers = config.get("summary_workers", 4)
+
+    compacted = compact_diff(text)
+    compact_text = compacted.text()
+    note = ""
+    if compacted.skipped:
+        note = f"\n(省略したファイル: {', '.join(compacted.skipped[:20])}{' ほか' if len(compacted.skipped) > 20 else ''})\n"
+
+    if estimate_tokens(compact_text) <= token_budget:
+        return compact_text + note
+
+    files = list(compacted.files)
+    if compacted.preamble:
+        # Commit message or plain-text input: chunk it line by line like a hunk
+        files.insert(0, FileDiff(path="", hunks=[[line] for line in compacted.preamble.splitlines(keepends=True)]))
+    chunks = split_chunks(files, chunk_tokens)
+    summary = summarize_chunks(client, chunks, chunk_tokens, workers, options=options, cache=cache, deadline=deadline)
+    return f"【大規模な差分のため自動要約した変更内容】\n{summary}\n{note}"
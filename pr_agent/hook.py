@@ -0,0 +1,129 @@
+"""
+Thin client for git hooks and CI: forwards a generation to the resident
+daemon (`main.py serve`) and prints the message. If the daemon is not
+running, it falls back to generating in-process like `main.py`.
+
+    git diff --cached | python pr_agent/hook.py pr
+
+Only light standard-library modules are imported here (no http.client, no
+generator code) so that a hook call costs little more than the LLM time.
+"""
+import argparse
+import json
+import os
+import sys
+
+# Adjust path to allow imports if running directly
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 11500
+DAEMON_URL_ENV = "PR_AGENT_DAEMON_URL"
+
+def default_url() -> str:
+    return os.environ.get(DAEMON_URL_ENV, f"http://{DEFAULT_HOST}:{DEFAULT_PORT}")
+
+def connect(url: str, timeout: float = 0.5) -> "socket.socket":
+    """Opens a connection to the daemon; raises OSError quickly if it is not running."""
+    # Imported here so main.py can read the defaults above without loading them
+    import socket
+    import urllib.parse
+
+    parsed = urllib.parse.urlsplit(url)
+    sock = socket.create_connection((parsed.hostname or DEFAULT_HOST, parsed.port or DEFAULT_PORT), timeout=timeout)
+    # Generation can take as long as the LLM needs
+    sock.settimeout(None)
+    return sock
+
+def call(sock: "socket.socket", request: dict) -> dict:
+    """Sends one generation request; raises Exception with the daemon's error message on failure."""
+    body = json.dumps(request, ensure_ascii=False).encode('utf-8')
+    head = (f"POST /generate HTTP/1.1\r\nHost: localhost\r\nContent-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n")
+    sock.sendall(head.encode('ascii') + body)
+    chunks = []
+    while True:
+        data = sock.recv(65536)
+        if not data:
+            break
+        chunks.append(data)
+    header, _, payload = b"".join(chunks).partition(b"\r\n\r\n")
+    try:
+        status = int(header.split(b" ", 2)[1])
+        data = json.loads(payload.decode('utf-8'))
+    except (IndexError, ValueError):
+        raise Exception("Invalid response from the daemon")
+    if status != 200:
+        raise Exception(data.get("error", f"daemon returned HTTP {status}"))
+    return data
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Generate a PR/merge message through the resident daemon")
+    parser.add_argument("command", choices=["pr", "merge"], help="Message type")
+    parser.add_argument("--input", "-i", type=str, help="Input text (diff or summary). Read from stdin if omitted.")
+    parser.add_argument("--character", "-c", type=str, help="Character name or index to use (default: active character)")
+    parser.add_argument("--no-cache", action="store_true", help="Bypass the response cache")
+    parser.add_argument("--json", action="store_true", help="Print the message and its metrics as one JSON object")
+    parser.add_argument("--deadline", type=float, help="Give up after this many seconds end to end (default: config 'deadline')")
+    parser.add_argument("--daemon", type=str, default=default_url(), help=f"Daemon URL (default: ${DAEMON_URL_ENV} or %(default)s)")
+    parser.add_argument("--config", type=str, help="config.json for the in-process fallback")
+    return parser
+
+def run_in_process(args, input_text: str) -> dict:
+    """Generates like `main.py <command> --json` in this process and returns its result."""
+    from pr_agent import main as cli
+
+    argv = ["--config", args.config] if args.config else []
+    argv += [args.command, "--input", input_text, "--json"]
+    if args.character:
+        argv += ["--character", args.character]
+    if args.no_cache:
+        argv.append("--no-cache")
+    if args.deadline:
+        argv += ["--deadline", str(args.deadline)]
+    # With --json, progress and errors go to stderr and nothing is printed to stdout
+    result = cli.run_command(cli.build_parser().parse_args(argv))
+    if result is None:
+        sys.exit(1)
+    return result
+
+def main():
+    args = build_parser().parse_args()
+    input_text = args.input
+    if not input_text:
+        if sys.stdin.isatty():
+            print("Error: No input provided. Pipe a diff or use --input.")
+            sys.exit(1)
+        input_text = sys.stdin.read()
+
+    in_process = False
+    try:
+        conn = connect(args.daemon)
+    except OSError:
+        print(f"Daemon not reachable at {args.daemon}; generating in-process.", file=sys.stderr)
+        result = run_in_process(args, input_text)
+        in_process = True
+    else:
+        request = {"command": args.command, "input": input_text, "character": args.character,
+                   "no_cache": args.no_cache, "deadline": args.deadline}
+        try:
+            result = call(conn, request)
+        except Exception as e:
+            print(f"Error: {e}", file=sys.stderr)
+            sys.exit(1)
+        finally:
+            conn.close()
+
+    if args.json:
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+    else:
+        print(result["message"])
+    if in_process:
+        # Let a background quote refresh finish before exiting, as main.py does
+        from pr_agent.main import REFRESH_WAIT_SECONDS
+        from pr_agent.search import wait_for_refreshes
+
+        wait_for_refreshes(REFRESH_WAIT_SECONDS)
+
+if __name__ == "__main__":
+    main()
@@ -2,67 +2,389 @@ import argparse
 import sys
 import json
 import os
-import random
+from typing import TYPE_CHECKING, Optional
 
 # Adjust path to allow imports if running directly
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from pr_agent.client import OllamaClient
-from pr_agent.prompts import get_messages
-from pr_agent.search import get_random_quote_context
+# Nothing from pr_agent is imported up front: the config store, the caches, the
+# HTTP client, the batch runner and the daemon are imported by the commands that
+# use them, so --help starts instantly (see benchmarks/import_time.py).
+if TYPE_CHECKING:
+    # Only for annotations
+    from pr_agent.character_store import CharacterStore
+    from pr_agent.config_store import ConfigStore
+    from pr_agent.search import QuoteCache
 
-CONFIG_PATH = os.path.join(os.path.dirname(__file__), "config.json")
+# How long a one-shot command waits at exit for background quote refreshes
+REFRESH_WAIT_SECONDS = 5
 
-def main():
-    parser = argparse.ArgumentParser(description="PR Message Generator with Character Persona")
-    parser.add_argument("command", choices=["pr", "merge"], help="Command to execute")
-    parser.add_argument("--input", "-i", type=str, help="Input text (diff or summary). Should be piped if large.")
-    parser.add_argument("--character", "-c", type=str, help="Character name or index to use (default: active character)")
+def find_character(characters: "CharacterStore", config: dict, selector: str = None):
+    """Finds a character by name or index, or returns the active character if no selector is given."""
+    if not selector:
+        return characters.active(config)
 
-    args = parser.parse_args()
-    
-    # Load Config
+    # Try to find by name first (indexed, case-insensitive)
+    character = characters.find_by_name(selector)
+    if character:
+        return character
+
+    # Try by index
     try:
-        with open(CONFIG_PATH, "r", encoding='utf-8') as f:
-            config = json.load(f)
-    except FileNotFoundError:
-        print("Error: config.json not found.")
-        return
-    
-    # Get characters
-    characters = config.get("characters", [])
-    if not characters:
-        print("Error: No characters defined in config.json")
-        return
-    
-    # Select character
+        return characters.at(int(selector))
+    except ValueError:
+        return None
+
+def _num_ctx(value: str):
+    return value if value == "auto" else int(value)
+
+def add_option_arguments(parser: argparse.ArgumentParser):
+    """Flags that override Ollama generation options from config.json's "options"."""
+    group = parser.add_argument_group("generation options (override config 'options')")
+    group.add_argument("--num-predict", type=int, help="Maximum tokens to generate (default: derived from target_length)")
+    group.add_argument("--num-ctx", type=_num_ctx, help="Context window in tokens, or 'auto' to size it to the prompt")
+    group.add_argument("--temperature", type=float)
+    group.add_argument("--seed", type=int)
+    group.add_argument("--stop", action="append", help="Stop sequence (repeatable)")
+    group.add_argument("--num-thread", type=int, help="CPU threads Ollama uses for generation")
+
+def option_overrides(args) -> dict:
+    """The generation options given on the command line."""
+    names = ("num_predict", "num_ctx", "temperature", "seed", "stop", "num_thread")
+    return {name: getattr(args, name) for name in names if getattr(args, name) is not None}
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="PR Message Generator with Character Persona")
+    parser.add_argument("--config", type=str, help="Path to config.json (default: the one next to this script)")
+    subparsers = parser.add_subparsers(dest="command", metavar="command", help="Command to execute")
+    subparsers.required = True
+
+    for name in ("pr", "merge"):
+        sub = subparsers.add_parser(name, help=f"Generate a {name.upper()} message")
+        sub.add_argument("--input", "-i", type=str, help="Input text (diff or summary). Should be piped if large.")
+        sub.add_argument("--character", "-c", type=str, help="Character name or index to use (default: active character)")
+        sub.add_argument("--no-stream", action="store_true", help="Wait for the full response instead of printing tokens as they arrive")
+        sub.add_argument("--no-cache", action="store_true", help="Always generate a fresh message, bypassing the response cache")
+        sub.add_argument("--metrics", action="store_true", help="Print per-stage timings and Ollama eval metrics after the message")
+        sub.add_argument("--json", action="store_true", help="Print the message and its metrics as one JSON object")
+        sub.add_argument("--metrics-log", type=str, help="Append metrics as a JSON line to this file (default: config 'metrics_log')")
+        sub.add_argument("--candidates", "-n", type=int, default=1, help="Generate N messages concurrently (different seeds) and print them ranked")
+        sub.add_argument("--deadline", type=float, help="Give up after this many seconds end to end (default: config 'deadline')")
+        add_option_arguments(sub)
+
+    subparsers.add_parser("warm-cache", help="Pre-fetch quotes for every configured character")
+
+    catalog = subparsers.add_parser("characters", help="List, import or export characters in the character store")
+    catalog_actions = catalog.add_subparsers(dest="action", metavar="action")
+    catalog_actions.required = True
+    listing = catalog_actions.add_parser("list", help="List characters (optionally matching a name or work)")
+    listing.add_argument("query", nargs="?", default="", help="Part of a name or work")
+    listing.add_argument("--page", type=int, default=1)
+    listing.add_argument("--page-size", type=int, default=50)
+    importing = catalog_actions.add_parser("import", help="Import characters from config.json's format")
+    importing.add_argument("file", help="A config.json (its \"characters\") or a JSON list of characters")
+    importing.add_argument("--replace", action="store_true", help="Delete all stored characters first")
+    exporting = catalog_actions.add_parser("export", help="Export characters in config.json's format")
+    exporting.add_argument("file", nargs="?", help="Output file (default: stdout)")
+
+    index = subparsers.add_parser("index", help="Build the offline quote index that replaces live search at generation time")
+    index.add_argument("--character", "-c", type=str, help="Character name or index (default: every character)")
+    index.add_argument("--file", "-f", action="append", default=[],
+                       help="Quotes to add: a JSON list or a text file with one quote per line (repeatable; needs --character)")
+    index.add_argument("--no-search", action="store_true", help="Index only --file quotes, without web search")
+    index.add_argument("--append", action="store_true", help="Keep the quotes already indexed for the character")
+
+    batch = subparsers.add_parser("batch", help="Generate messages for many inputs (JSONL, a directory of diffs or a git range)")
+    source = batch.add_mutually_exclusive_group(required=True)
+    source.add_argument("--jsonl", type=str, help="JSONL file with one {\"id\", \"input\", \"command\", \"character\"} object per line")
+    source.add_argument("--dir", type=str, help="Directory with one diff per file")
+    source.add_argument("--git-range", type=str, help="git log range, e.g. 'main~100..main'")
+    batch.add_argument("--repo", type=str, default=".", help="Repository for --git-range (default: current directory)")
+    batch.add_argument("--type", choices=["pr", "merge"], default="pr", help="Message type for jobs that do not set one")
+    batch.add_argument("--character", "-c", type=str, help="Character name or index for jobs that do not set one")
+    batch.add_argument("--output", "-o", type=str, help="Output JSONL file (default: stdout)")
+    batch.add_argument("--workers", "-w", type=int, default=4, help="Number of concurrent generations")
+    batch.add_argument("--ordered", action="store_true", help="Write results in input order")
+    batch.add_argument("--resume", action="store_true", help="Skip jobs already written successfully to --output")
+    batch.add_argument("--no-cache", action="store_true", help="Always generate fresh messages, bypassing the response cache")
+    add_option_arguments(batch)
+
+    daemon = subparsers.add_parser("serve", help="Run a resident generator for hook.py (keeps the client and caches warm)")
+    daemon.add_argument("--host", type=str, help="Address to listen on (default: config 'daemon_host', else the one hook.py connects to)")
+    daemon.add_argument("--port", type=int, help="Port to listen on (default: config 'daemon_port', else the one hook.py connects to)")
+    return parser
+
+def open_response_cache(args, config: dict):
+    """Returns the response cache if it is enabled in config and not disabled with --no-cache."""
+    if not config.get("response_cache", False) or args.no_cache:
+        return None
+    from pr_agent.response_cache import ResponseCache
+
+    return ResponseCache.from_config(config)
+
+def run_characters_command(args, config: dict, characters: "CharacterStore"):
+    if args.action == "list":
+        total = characters.count(args.query)
+        page_size = max(1, args.page_size)
+        for character in characters.search(args.query, offset=(args.page - 1) * page_size, limit=page_size):
+            print(f"{character['id']:>6}  {character['name']} ({character['work']})")
+        print(f"Page {args.page}/{max(1, -(-total // page_size))} of {total} characters.")
+    elif args.action == "import":
+        try:
+            with open(args.file, "r", encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Error: Could not read {args.file}: {e}")
+            return
+        imported = characters.import_characters(data.get("characters", []) if isinstance(data, dict) else data,
+                                                replace=args.replace)
+        print(f"Imported {imported} characters ({characters.count()} in the store).")
+    else:
+        exported = json.dumps(characters.export_characters(), indent=4, ensure_ascii=False)
+        if args.file:
+            with open(args.file, "w", encoding='utf-8') as f:
+                f.write(exported + "\n")
+            print(f"Exported {characters.count()} characters to {args.file}.")
+        else:
+            print(exported)
+
+def open_quote_index(config: dict):
+    """Returns the offline quote index unless it is disabled with `"quote_index": false` in config."""
+    from pr_agent.quote_index import QuoteIndex
+
+    return QuoteIndex.from_config(config) if config.get("quote_index", True) else None
+
+def run_index_command(args, config: dict, characters: "CharacterStore", quote_cache: "QuoteCache"):
+    from pr_agent.quote_index import QuoteIndex, dedupe_quotes, extract_quotes, load_quote_file
+    from pr_agent.search import search_quotes
+
     if args.character:
-        # Try to find by name first
-        character_config = None
-        for char in characters:
-            if char.get("name", "").lower() == args.character.lower():
-                character_config = char
-                break
-        
-        # Try by index
-        if not character_config:
-            try:
-                idx = int(args.character)
-                if 0 <= idx < len(characters):
-                    character_config = characters[idx]
-            except ValueError:
-                pass
-        
+        character_config = find_character(characters, config, args.character)
         if not character_config:
             print(f"Error: Character '{args.character}' not found")
             return
+        selected = [character_config]
+    elif args.file:
+        print("Error: --file requires --character.")
+        return
+    else:
+        selected = list(characters)
+
+    file_quotes = []
+    for path in args.file:
+        try:
+            file_quotes.extend(load_quote_file(path))
+        except (OSError, ValueError) as e:
+            print(f"Error: Could not read {path}: {e}")
+            return
+
+    index = QuoteIndex.from_config(config)
+    failed = []
+    for character_config in selected:
+        char_name = character_config.get("name", "")
+        work_name = character_config.get("work", "")
+        if not char_name:
+            continue
+        collected = list(file_quotes)
+        if not args.no_search:
+            for snippet in search_quotes(char_name, work_name, cache=quote_cache,
+                                         timeout=config.get("search_timeout", 5)):
+                collected.extend(extract_quotes(snippet))
+        if not collected:
+            # A failed search (offline, rate-limited, duckduckgo_search missing) must not wipe the entry
+            failed.append(char_name)
+            print(f"No quotes found for {char_name}; kept its {len(index.quotes(char_name, work_name))} indexed quotes.")
+            continue
+        quotes = dedupe_quotes((index.quotes(char_name, work_name) if args.append else []) + collected)
+        index.put(char_name, work_name, quotes)
+        print(f"Indexed {len(quotes)} quotes for {char_name}.")
+    print(f"Quote index: {index.path}")
+    if failed:
+        print(f"Error: No quotes found for {len(failed)} of {len(selected)} characters (search failed or returned nothing).")
+        sys.exit(1)
+
+def run_batch_command(args, config: dict, characters: "CharacterStore", quote_cache: "QuoteCache"):
+    from pr_agent.batch import iter_dir_jobs, iter_git_jobs, iter_jsonl_jobs, run_batch
+    from pr_agent.client import OllamaClient
+    from pr_agent.diff import prepare_diff_input
+    from pr_agent.pipeline import (generate_message, generation_options, length_target, request_deadline,
+                                   select_indexed_quotes)
+    from pr_agent.prompts import build_prompt, build_request_input
+    from pr_agent.search import get_random_quote_context
+
+    if args.resume and not args.output:
+        print("Error: --resume requires --output.")
+        return
+
+    # Check the job source before run_batch opens (and truncates) --output
+    if args.jsonl:
+        if not os.path.isfile(args.jsonl):
+            print(f"Error: JSONL file not found: {args.jsonl}")
+            return
+        jobs = iter_jsonl_jobs(args.jsonl)
+    elif args.dir:
+        if not os.path.isdir(args.dir):
+            print(f"Error: Directory not found: {args.dir}")
+            return
+        jobs = iter_dir_jobs(args.dir)
     else:
-        # Use active character
-        active_index = config.get("active_character_index", 0)
-        if active_index >= len(characters):
-            active_index = 0
-        character_config = characters[active_index]
-    
+        try:
+            jobs = iter_git_jobs(args.git_range, repo=args.repo)
+        except ValueError as e:
+            print(f"Error: {e}")
+            return
+
+    # One pooled connection per worker
+    client = OllamaClient.from_config(dict(config, pool_size=max(config.get("pool_size", 4), args.workers)))
+    if not client.check_connection(timeout=config.get("health_timeout", 2)):
+        print(f"Error: Could not connect to Ollama ({', '.join(client.api_urls)}). Make sure Ollama is running (e.g., 'ollama serve')")
+        return
+    response_cache = open_response_cache(args, config)
+    options = generation_options(config, use_cache=response_cache is not None, overrides=option_overrides(args))
+    quote_index = open_quote_index(config)
+    cache_hits = []
+
+    def generate(job: dict) -> dict:
+        character_config = find_character(characters, config, job.get("character") or args.character)
+        if not character_config:
+            raise Exception(f"Character '{job.get('character') or args.character}' not found")
+        command = job.get("command") or args.type
+        char_name = character_config.get("name", "Unknown")
+
+        deadline = request_deadline(config)
+        search_context = select_indexed_quotes(quote_index, character_config, config, job.get("input", ""),
+                                               seed=options.get("seed"))
+        if not search_context and config.get("use_search", False) and char_name:
+            search_context = get_random_quote_context(char_name, character_config.get("work", ""),
+                                                      cache=quote_cache, seed=options.get("seed"),
+                                                      timeout=config.get("search_timeout", 5))
+
+        input_text = prepare_diff_input(client, job.get("input", ""), config, options=options, cache=response_cache,
+                                        deadline=deadline)
+        input_text = build_request_input(command, input_text)
+        prompt = build_prompt(character_config, input_text, search_context, config)
+        result = generate_message(client, prompt, options, response_cache, deadline=deadline,
+                                  target_length=length_target(config))
+        if result.cached:
+            cache_hits.append(job["id"])
+        return {"command": command, "character": char_name, "message": result.text,
+                "cached": result.cached, "metrics": result.to_dict()}
+
+    stats = run_batch(jobs, generate, output_path=args.output, workers=args.workers,
+                      ordered=args.ordered, resume=args.resume)
+    print(f"Batch finished: {stats['done']} done, {stats['failed']} failed, {stats['skipped']} skipped "
+          f"in {stats['elapsed']:.1f}s ({stats['messages_per_min']:.1f} messages/min)", file=sys.stderr)
+    if response_cache is not None:
+        generated = stats["done"] + stats["failed"]
+        rate = len(cache_hits) / generated if generated else 0.0
+        print(f"Response cache: {len(cache_hits)}/{generated} hits ({rate:.0%})", file=sys.stderr)
+
+def run_serve_command(args, store: "ConfigStore", config: dict, characters: "CharacterStore", quote_cache: "QuoteCache"):
+    """
+    Serves generation requests from hook.py. The config is re-read (if the
+    file changed) on every request; the client is rebuilt only when its own
+    settings change, so connections and the loaded model stay warm.
+    """
+    import threading
+
+    from pr_agent.client import CLIENT_CONFIG_KEYS, OllamaClient
+    from pr_agent.daemon import serve
+    from pr_agent.diff import prepare_diff_input
+    from pr_agent.hook import DEFAULT_HOST, DEFAULT_PORT
+    from pr_agent.metrics import append_metrics_log, build_metrics, timed
+    from pr_agent.pipeline import (generate_message, generation_options, length_target, prepare_context,
+                                   request_deadline, start_warm_up)
+    from pr_agent.prompts import build_prompt, build_request_input
+    from pr_agent.quote_index import QuoteIndex
+    from pr_agent.response_cache import ResponseCache
+
+    clients = {}
+    lock = threading.Lock()
+    response_cache = ResponseCache.from_config(config) if config.get("response_cache", False) else None
+    # Kept for the daemon's lifetime: it re-reads the file only after `main.py index` changes it
+    quote_index = QuoteIndex.from_config(config)
+
+    def get_client(config: dict) -> OllamaClient:
+        key = json.dumps({name: config[name] for name in CLIENT_CONFIG_KEYS if name in config}, sort_keys=True)
+        with lock:
+            if key not in clients:
+                # Settings changed: stop the old client's health checks and close its connections
+                for old_client in clients.values():
+                    old_client.close()
+                clients.clear()
+                clients[key] = OllamaClient.from_config(config)
+                start_warm_up(clients[key])
+            return clients[key]
+
+    def handle(request: dict) -> dict:
+        timings = {}
+        with timed(timings, "config_load"):
+            config = store.load()
+        command = request.get("command", "pr")
+        if command not in ("pr", "merge"):
+            raise ValueError(f"Unknown command '{command}'")
+        character_config = find_character(characters, config, request.get("character"))
+        if not character_config:
+            raise LookupError(f"Character '{request.get('character')}' not found")
+        char_name = character_config.get("name", "Unknown")
+
+        deadline = request_deadline(config, request.get("deadline"))
+        client = get_client(config)
+        cache = response_cache if config.get("response_cache", False) and not request.get("no_cache") else None
+        options = generation_options(config, use_cache=cache is not None)
+        with timed(timings, "prepare"):
+            prepared = prepare_context(client, character_config, config, cache=quote_cache, seed=options.get("seed"),
+                                       deadline=deadline, index=quote_index if config.get("quote_index", True) else None,
+                                       query=request.get("input", ""))
+        timings.update(prepared.timings)
+        if not prepared.connected:
+            raise Exception(f"Could not connect to Ollama ({', '.join(client.api_urls)})")
+        with timed(timings, "diff_prep"):
+            input_text = prepare_diff_input(client, request.get("input", ""), config, options=options, cache=cache,
+                                            deadline=deadline)
+        with timed(timings, "prompt_build"):
+            prompt = build_prompt(character_config, build_request_input(command, input_text),
+                                  prepared.search_context, config)
+        with timed(timings, "generation"):
+            result = generate_message(client, prompt, options, cache, deadline=deadline,
+                                      target_length=length_target(config))
+
+        metrics = build_metrics(result, timings)
+        if config.get("metrics_log"):
+            append_metrics_log(config["metrics_log"], dict(metrics, command=command, character=char_name))
+        return {"command": command, "character": char_name, "message": result.text, "metrics": metrics}
+
+    # Load the model before the first hook call arrives
+    get_client(config)
+    serve(handle, host=args.host or config.get("daemon_host", DEFAULT_HOST),
+          port=args.port or config.get("daemon_port", DEFAULT_PORT))
+    for client in clients.values():
+        client.close()
+    if response_cache is not None:
+        response_cache.close()
+
+def run_generate_command(args, config: dict, characters: "CharacterStore", quote_cache: "QuoteCache",
+                         timings: dict) -> Optional[dict]:
+    """
+    Generates one PR/merge message. Returns the result (the object printed
+    with --json), or None after logging an error.
+    """
+    from pr_agent.client import OllamaClient
+    from pr_agent.diff import prepare_diff_input
+    from pr_agent.metrics import append_metrics_log, build_metrics, format_metrics, timed
+    from pr_agent.pipeline import (generate_candidates, generate_message, generation_options, length_target,
+                                   prepare_context, request_deadline)
+    from pr_agent.prompts import build_prompt, build_request_input
+
+    # With --json, stdout carries only the JSON result
+    log = (lambda *a, **kw: print(*a, file=sys.stderr, **kw)) if args.json else print
+
+    # Select character
+    character_config = find_character(characters, config, args.character)
+    if not character_config:
+        log(f"Error: Character '{args.character}' not found")
+        return
+
     char_name = character_config.get("name", "Unknown")
     work_name = character_config.get("work", "Unknown")
 
@@ -73,39 +395,156 @@ def main():
         if not sys.stdin.isatty():
              input_text = sys.stdin.read()
         else:
-             print("Error: No input provided. Pipe a diff or use --input.")
+             log("Error: No input provided. Pipe a diff or use --input.")
              return
 
     # Initialize Client
-    client = OllamaClient(api_url=config["api_url"], model=config["model"])
-    
-    print(f"Generating {args.command.upper()} message as {char_name} ({work_name})...")
-    
-    # Step: Search for character quotes if enabled
-    search_context = ""
-    if config.get("use_search", False) and char_name:
-        print(f"Searching quotes for character: {char_name}...")
-        try:
-            search_context = get_random_quote_context(char_name, work_name)
-        except Exception as e:
-            print(f"Search failed: {e}")
+    client = OllamaClient.from_config(config)
+    response_cache = open_response_cache(args, config)
+    options = generation_options(config, use_cache=response_cache is not None, overrides=option_overrides(args))
+    # Messages are capped and cut off at target_length unless length_budget is off
+    target_length = length_target(config)
 
-    # Customize prompt slightly based on command
-    if args.command == "merge":
-        input_text = f"This is a MERGE request. Input details: {input_text}"
-    else:
-        input_text = f"This is a PULL REQUEST. Input changes: {input_text}"
+    log(f"Generating {args.command.upper()} message as {char_name} ({work_name})...")
+
+    # Step: Health check and quote search run concurrently
+    quote_index = open_quote_index(config)
+    if config.get("use_search", False) and char_name and not (
+            quote_index and quote_index.quotes(char_name, character_config.get("work", ""))):
+        log(f"Searching quotes for character: {char_name}...")
+    # One deadline for every stage below (--deadline or config 'deadline')
+    deadline = request_deadline(config, args.deadline)
+    with timed(timings, "prepare"):
+        prepared = prepare_context(client, character_config, config, cache=quote_cache, seed=options.get("seed"),
+                                   deadline=deadline, index=quote_index, query=input_text)
+    timings.update(prepared.timings)
+    if not prepared.connected:
+        log(f"Error: Could not connect to Ollama ({', '.join(client.api_urls)}). Make sure Ollama is running (e.g., 'ollama serve')")
+        return
+    if prepared.search_error:
+        log(f"Search failed: {prepared.search_error} (continuing without quotes)")
+    search_context = prepared.search_context
 
-    target_length = config.get("target_length", 300)
-    prompt = get_messages(character_config, input_text, search_context, target_length=target_length)
-    
+    candidates = []
     try:
-        response = client.generate_text(prompt)
-        print("\n=== GENERATED MESSAGE ===\n")
-        print(response)
-        print("\n=========================\n")
+        # Drop noise from the diff and summarize it if it is over the token budget
+        with timed(timings, "diff_prep"):
+            input_text = prepare_diff_input(client, input_text, config, options=options, cache=response_cache,
+                                            deadline=deadline)
+
+        with timed(timings, "prompt_build"):
+            # Customize prompt slightly based on command
+            input_text = build_request_input(args.command, input_text)
+            prompt = build_prompt(character_config, input_text, search_context, config)
+
+        if args.candidates > 1:
+            with timed(timings, "generation"):
+                candidates = generate_candidates(client, prompt, character_config, args.candidates, options,
+                                                 response_cache, target_length=config.get("target_length", 300),
+                                                 deadline=deadline, length_budget=target_length is not None)
+            result = candidates[0].result
+            if not args.json:
+                for rank, candidate in enumerate(candidates, 1):
+                    scores = ", ".join(f"{name} {value:.2f}" for name, value in candidate.scores.items() if name != "total")
+                    print(f"\n=== CANDIDATE {rank}/{len(candidates)} (score {candidate.scores['total']:.2f}: {scores}; seed {candidate.seed}) ===\n")
+                    print(candidate.result.text)
+                print("\n=========================\n")
+        elif args.json:
+            with timed(timings, "generation"):
+                result = generate_message(client, prompt, options, response_cache, deadline=deadline,
+                                          target_length=target_length)
+        else:
+            print("\n=== GENERATED MESSAGE ===\n")
+            with timed(timings, "generation"):
+                if args.no_stream:
+                    result = generate_message(client, prompt, options, response_cache, deadline=deadline,
+                                              target_length=target_length)
+                    print(result.text)
+                else:
+                    result = generate_message(client, prompt, options, response_cache,
+                                              on_token=lambda token: print(token, end="", flush=True),
+                                              deadline=deadline, target_length=target_length)
+                    print()
+            print("\n=========================\n")
     except Exception as e:
-        print(f"Error: {e}")
+        log(f"Error: {e}")
+        return
+
+    metrics = build_metrics(result, timings, endpoints=client.endpoint_stats() if len(client.endpoints) > 1 else None)
+    output = {"command": args.command, "character": char_name, "message": result.text, "metrics": metrics}
+    if candidates:
+        output["candidates"] = [{"message": candidate.result.text, "seed": candidate.seed, "scores": candidate.scores,
+                                 "metrics": candidate.result.to_dict()} for candidate in candidates]
+    if not args.json:
+        if response_cache is not None:
+            print(f"Response cache: {'hit' if result.cached else 'miss'} (hit rate {response_cache.hit_rate():.0%})")
+        if args.metrics:
+            print(format_metrics(metrics))
+
+    metrics_log = args.metrics_log or config.get("metrics_log")
+    if metrics_log:
+        append_metrics_log(metrics_log, dict(metrics, command=args.command, character=char_name))
+    return output
+
+def run_command(args) -> Optional[dict]:
+    """
+    Runs a parsed command. For pr/merge, returns the result that --json
+    prints (None on errors, which are logged to stderr with --json).
+    """
+    from pr_agent.config_store import CONFIG_PATH, ConfigStore
+    from pr_agent.metrics import timed
+    from pr_agent.search import QuoteCache, warm_cache
+
+    timings = {}
+    # With --json, stdout carries only the JSON result
+    log = (lambda *a, **kw: print(*a, file=sys.stderr, **kw)) if getattr(args, "json", False) else print
+
+    # Load Config
+    store = ConfigStore(args.config or CONFIG_PATH)
+    try:
+        with timed(timings, "config_load"):
+            config = store.load()
+    except FileNotFoundError:
+        log("Error: config.json not found.")
+        return
+
+    # Get characters (seeded from config.json on first use)
+    from pr_agent.character_store import CharacterStore
+
+    characters = CharacterStore.from_config(config, config_path=store.path)
+    if args.command == "characters":
+        run_characters_command(args, config, characters)
+        return
+    if not characters.count():
+        log("Error: No characters defined (add them to config.json or run 'characters import')")
+        return
+
+    quote_cache = QuoteCache.from_config(config)
+    if args.command == "warm-cache":
+        stored = warm_cache(list(characters), quote_cache)
+        print(f"Cached quotes for {stored}/{characters.count()} characters.")
+        return
+    if args.command == "index":
+        run_index_command(args, config, characters, quote_cache)
+        return
+    if args.command == "batch":
+        run_batch_command(args, config, characters, quote_cache)
+        return
+    if args.command == "serve":
+        run_serve_command(args, store, config, characters, quote_cache)
+        return
+
+    return run_generate_command(args, config, characters, quote_cache, timings)
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    output = run_command(args)
+    if output is not None and args.json:
+        print(json.dumps(output, ensure_ascii=False, indent=2))
+    # Let a stale quote entry's background refresh finish, now that the output is out
+    from pr_agent.search import wait_for_refreshes
+
+    wait_for_refreshes(REFRESH_WAIT_SECONDS)
 
 if __name__ == "__main__":
     main()
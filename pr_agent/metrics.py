@@ -0,0 +1,73 @@
+import json
+import os
+import time
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Dict, List, Optional
+
+if TYPE_CHECKING:
+    # Only for annotations: keeps `timed` importable without loading the HTTP client
+    from pr_agent.client import GenerationResult
+
+@contextmanager
+def timed(timings: Dict[str, float], stage: str):
+    """Records the wall-clock seconds spent in the block under timings[stage]."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[stage] = timings.get(stage, 0.0) + time.perf_counter() - start
+
+def build_metrics(result: Optional["GenerationResult"], timings: Dict[str, float],
+                  endpoints: Optional[List[dict]] = None) -> dict:
+    """Combines client-side stage timings with Ollama's metrics for one generation."""
+    metrics = {"stages": {name: round(seconds, 4) for name, seconds in timings.items()}}
+    if result is not None:
+        metrics["generation"] = result.to_dict()
+    if endpoints:
+        metrics["endpoints"] = endpoints
+    return metrics
+
+def format_metrics(metrics: dict) -> str:
+    """Renders metrics as aligned text lines for the terminal."""
+    lines = ["Stages (client):"]
+    for name, seconds in metrics["stages"].items():
+        lines.append(f"  {name:20s} {seconds * 1000:10.1f} ms")
+    generation = metrics.get("generation")
+    if generation:
+        lines.append("Ollama:")
+        for name in ("load_duration", "prompt_eval_duration", "eval_duration", "total_duration"):
+            if generation.get(name) is not None:
+                lines.append(f"  {name:20s} {generation[name] / 1e6:10.1f} ms")
+        for name in ("prompt_eval_count", "eval_count"):
+            if generation.get(name) is not None:
+                lines.append(f"  {name:20s} {generation[name]:10d}")
+        if generation.get("tokens_per_second"):
+            lines.append(f"  {'tokens_per_second':20s} {generation['tokens_per_second']:10.1f}")
+        # Client-side: a stream stopped at target_length never gets Ollama's metrics
+        for name in ("first_token_seconds", "http_seconds"):
+            if generation.get(name) is not None:
+                lines.append(f"  {name:20s} {generation[name] * 1000:10.1f} ms")
+        if generation.get("eval_count") is None and generation.get("streamed_tokens"):
+            lines.append(f"  {'streamed_tokens':20s} {generation['streamed_tokens']:10d}")
+        if generation.get("endpoint"):
+            lines.append(f"  {'endpoint':20s} {generation['endpoint']}")
+        if generation.get("cached"):
+            lines.append("  (served from response cache)")
+        if generation.get("stopped_early"):
+            lines.append("  (stopped at target_length)")
+    if metrics.get("endpoints"):
+        lines.append("Endpoints:")
+        for endpoint in metrics["endpoints"]:
+            state = "up" if endpoint["healthy"] else "down"
+            latency = f"{endpoint['latency_ms']:.0f} ms" if endpoint["latency_ms"] is not None else "-"
+            lines.append(f"  {endpoint['api_url']:40s} {state:4s} {endpoint['requests']:4d} req "
+                         f"{endpoint['failures']:3d} failed  avg {latency}")
+    return "\n".join(lines)
+
+def append_metrics_log(path: str, record: dict):
+    """Appends one JSON line to the metrics log."""
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    record = dict(record, timestamp=time.strftime("%Y-%m-%dT%H:%M:%S"))
+    with open(path, "a", encoding='utf-8') as f:
+        f.write(json.dumps(record, ensure_ascii=False) + "\n")
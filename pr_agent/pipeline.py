@@ -0,0 +1,281 @@
+import math
+import random
+import re
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Union
+
+from pr_agent.client import GenerationResult, OllamaClient
+from pr_agent.metrics import timed
+from pr_agent.ranking import score_message
+from pr_agent.response_cache import ResponseCache
+from pr_agent.quote_index import QuoteIndex
+from pr_agent.search import QuoteCache, format_quote_context, get_random_quote_context
+
+# Tokens allowed per character of target_length: Japanese text is about one
+# token per character, plus headroom so the message can finish its sentence
+NUM_PREDICT_PER_CHAR = 1.5
+# End of a sentence, with any closing brackets or quotes that follow it
+SENTENCE_END_RE = re.compile(r"[。！？!?\n][」』）)】]*")
+
+@dataclass
+class PreparedContext:
+    """Results of the stages that run before generation."""
+    connected: bool
+    search_context: str = ""
+    search_error: Optional[str] = None
+    # Where the quotes came from: "index", "search" or None
+    quote_source: Optional[str] = None
+    # Seconds spent in each stage (the stages overlap)
+    timings: Dict[str, float] = field(default_factory=dict)
+
+@dataclass
+class Candidate:
+    """One of several generations for the same prompt, with its seed and scores."""
+    result: GenerationResult
+    seed: int
+    scores: Dict[str, float]
+
+def generation_options(config: dict, use_cache: bool = False, overrides: Optional[dict] = None) -> dict:
+    """
+    Ollama generation options from config, with `overrides` (e.g. from the
+    command line) on top. With the response cache on, seed and temperature
+    are pinned so that a cached message is one the model would actually
+    produce again.
+    """
+    options = dict(config.get("options", {}))
+    options.update(overrides or {})
+    if use_cache:
+        options.setdefault("seed", 42)
+        options.setdefault("temperature", 0.8)
+    return options
+
+def length_target(config: dict) -> Optional[int]:
+    """
+    The length in characters that messages are budgeted to (`target_length`),
+    or None when `length_budget` is off in config and only the prompt asks for it.
+    """
+    return config.get("target_length", 300) if config.get("length_budget", True) else None
+
+def length_budget_options(options: Optional[dict], target_length: int) -> dict:
+    """`options` with a num_predict cap for a message of about `target_length` characters, unless one is set."""
+    options = dict(options or {})
+    options.setdefault("num_predict", math.ceil(target_length * NUM_PREDICT_PER_CHAR))
+    return options
+
+def stop_at_length(tokens: Iterable[str], target_length: int) -> Iterator[str]:
+    """
+    Passes tokens through until the text reaches `target_length` characters
+    (whitespace not counted, as in ranking.length_score), then ends at the
+    next sentence boundary, cutting the token that contains it. When the
+    boundary ends a token, one more token is read: if the stream ends there,
+    nothing was cut and Ollama's final chunk (with its metrics) is consumed.
+    """
+    tokens = iter(tokens)
+    length = 0
+    for token in tokens:
+        length += len("".join(token.split()))
+        if length >= target_length:
+            boundary = None
+            for boundary in SENTENCE_END_RE.finditer(token):
+                pass
+            if boundary:
+                yield token[:boundary.end()]
+                if not token[boundary.end():].strip():
+                    next(tokens, None)
+                return
+        yield token
+
+def run_in_thread(fn: Callable, *args, **kwargs) -> Future:
+    """
+    Runs `fn` on a daemon thread and returns a Future for its result.
+    Unlike a ThreadPoolExecutor, a stage that misses its deadline never
+    blocks interpreter exit.
+    """
+    future = Future()
+
+    def run():
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except BaseException as e:
+            future.set_exception(e)
+
+    threading.Thread(target=run, daemon=True).start()
+    return future
+
+def start_warm_up(client: OllamaClient) -> Future:
+    """Loads the model in the background so the first real request skips the cold load."""
+    return run_in_thread(client.warm_up)
+
+def _remaining(deadline: float) -> float:
+    return max(0.0, deadline - time.monotonic())
+
+def request_deadline(config: dict, seconds: Optional[float] = None) -> Optional[float]:
+    """
+    The time.monotonic() value by which one whole generation (health check,
+    search, diff summary and the message itself) must finish: `seconds` if
+    given, else `deadline` in config. None means no end-to-end limit.
+    """
+    seconds = seconds if seconds is not None else config.get("deadline")
+    return time.monotonic() + seconds if seconds else None
+
+def select_indexed_quotes(index: Optional[QuoteIndex], character_config: dict, config: dict, query: str,
+                          seed: Optional[int] = None) -> str:
+    """
+    The quote section built from the offline index: the `quote_top_k` quotes
+    most relevant to `query` (the diff or summary). "" if the character has
+    no indexed quotes.
+    """
+    if index is None or not character_config.get("name"):
+        return ""
+    selected = index.top_k(character_config["name"], character_config.get("work", ""), query,
+                           k=config.get("quote_top_k", 3), seed=seed)
+    return format_quote_context(character_config["name"], [quote for quote, _score in selected]) if selected else ""
+
+def prepare_context(client: OllamaClient, character_config: dict, config: dict,
+                    cache: Optional[QuoteCache] = None, seed: Optional[int] = None,
+                    deadline: Optional[float] = None, index: Optional[QuoteIndex] = None,
+                    query: str = "") -> PreparedContext:
+    """
+    Runs the health check and the quote search concurrently, each bounded by
+    its own deadline (`health_timeout` / `search_timeout` in config, capped by
+    the request `deadline`). A search that misses its deadline is abandoned
+    and generation goes ahead without quotes. When `index` has quotes for the
+    character, they are ranked against `query` instead and there is no search.
+    """
+    health_timeout = config.get("health_timeout", 2)
+    search_timeout = config.get("search_timeout", 5)
+    if deadline is not None:
+        health_timeout = min(health_timeout, _remaining(deadline))
+        search_timeout = min(search_timeout, _remaining(deadline))
+    start = time.monotonic()
+    timings = {}
+
+    def timed_call(stage: str, fn: Callable, *args, **kwargs):
+        with timed(timings, stage):
+            return fn(*args, **kwargs)
+
+    health = run_in_thread(timed_call, "health_check", client.check_connection, timeout=health_timeout)
+
+    indexed = ""
+    if index is not None:
+        with timed(timings, "quote_select"):
+            indexed = select_indexed_quotes(index, character_config, config, query, seed=seed)
+
+    search = None
+    char_name = character_config.get("name", "")
+    if config.get("use_search", False) and char_name and not indexed:
+        work_name = character_config.get("work", "")
+        search = run_in_thread(timed_call, "search", get_random_quote_context, char_name, work_name,
+                               cache=cache, seed=seed, timeout=search_timeout)
+
+    try:
+        connected = health.result(timeout=_remaining(start + health_timeout + 1))
+    except FutureTimeout:
+        connected = False
+
+    prepared = PreparedContext(connected=connected, timings=timings)
+    if indexed:
+        prepared.search_context, prepared.quote_source = indexed, "index"
+    if search is None or not connected:
+        return prepared
+
+    try:
+        prepared.search_context = search.result(timeout=_remaining(start + search_timeout))
+        prepared.quote_source = "search" if prepared.search_context else None
+    except FutureTimeout:
+        prepared.search_error = f"search timed out after {search_timeout:.1f}s"
+        timings["search"] = search_timeout
+    except Exception as e:
+        prepared.search_error = str(e)
+    return prepared
+
+def generate_message(client: OllamaClient, prompt: Union[str, List[dict]], options: Optional[dict] = None,
+                     cache: Optional[ResponseCache] = None,
+                     on_token: Optional[Callable[[str], None]] = None,
+                     deadline: Optional[float] = None, target_length: Optional[int] = None) -> GenerationResult:
+    """
+    Generates a message, serving it from `cache` when possible. `prompt` is
+    either a prompt string (/api/generate) or a list of chat messages
+    (/api/chat). Tokens are passed to `on_token` as they stream in (a cached
+    message arrives as one token); if `on_token` raises, e.g. because the UI
+    cancelled the run, the stream is closed and Ollama stops generating.
+    With `target_length` (see length_target), num_predict is capped to match
+    and the generation is stopped at the first sentence boundary past that
+    length (`stopped_early` on the result), so no GPU time is spent on text
+    that would be thrown away. The result carries Ollama's metrics, or
+    `cached=True` on a hit.
+    """
+    if target_length:
+        options = length_budget_options(options, target_length)
+    key = None
+    if cache is not None:
+        key = ResponseCache.make_key(client.model, prompt, options)
+        cached = cache.get(key)
+        if cached is not None:
+            if on_token:
+                on_token(cached)
+            return GenerationResult(text=cached, model=client.model, cached=True)
+
+    is_chat = not isinstance(prompt, str)
+    if on_token or target_length:
+        # Stopping early needs the stream even when the caller only wants the result
+        result = GenerationResult()
+        stream = (client.chat_stream if is_chat else client.generate_stream)(
+            prompt, options=options, result=result, deadline=deadline)
+        parts = []
+        try:
+            for token in stop_at_length(stream, target_length) if target_length else stream:
+                parts.append(token)
+                if on_token:
+                    on_token(token)
+        finally:
+            # Close the connection right away instead of when the generator is collected
+            stream.close()
+        if result.total_duration is None:
+            # Closed before Ollama's final chunk, so text was dropped: keep the text up to the cut
+            result.text = "".join(parts)
+            result.stopped_early = True
+    else:
+        complete = client.chat if is_chat else client.generate
+        result = complete(prompt, options=options, deadline=deadline)
+
+    if cache is not None:
+        cache.put(key, result.text)
+    return result
+
+def generate_candidates(client: OllamaClient, prompt: Union[str, List[dict]], character_config: dict, count: int,
+                        options: Optional[dict] = None, cache: Optional[ResponseCache] = None,
+                        target_length: int = 300, deadline: Optional[float] = None,
+                        length_budget: bool = True) -> List[Candidate]:
+    """
+    Generates `count` messages concurrently, each with its own seed, and
+    returns them best first by score_message. Seeds count up from
+    options["seed"] (random if unset), so a fixed seed gives a reproducible
+    and cacheable set. With `length_budget`, each one is budgeted and stopped
+    at `target_length` like generate_message. Failed generations are dropped
+    unless all of them fail.
+    """
+    options = dict(options or {})
+    base_seed = options.get("seed", random.randrange(2 ** 31))
+
+    def generate(index: int) -> Candidate:
+        seed = base_seed + index
+        result = generate_message(client, prompt, dict(options, seed=seed), cache, deadline=deadline,
+                                  target_length=target_length if length_budget else None)
+        return Candidate(result=result, seed=seed, scores=score_message(result.text, character_config, target_length))
+
+    candidates, errors = [], []
+    with ThreadPoolExecutor(max_workers=max(1, count)) as executor:
+        for future in [executor.submit(generate, index) for index in range(count)]:
+            try:
+                candidates.append(future.result())
+            except Exception as e:
+                errors.append(e)
+    if not candidates:
+        raise errors[0]
+    return sorted(candidates, key=lambda candidate: candidate.scores["total"], reverse=True)
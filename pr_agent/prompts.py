@@ -1,4 +1,5 @@
-PR_SYSTEM_PROMPT = """
+# Persona and instructions, shared by both prompt layouts so they cannot drift apart
+PERSONA_PROMPT = """
 あなたは熟練したソフトウェアエンジニアであり、同時に「{name}」（作品名: {work}）というキャラクターになりきっています。
 あなたのタスクは、**あなたが実装した**コードの変更点や要約に基づいて、プルリクエスト（PR）の説明文やマージコミットメッセージを作成することです。
 
@@ -11,11 +12,52 @@ PR_SYSTEM_PROMPT = """
 3. 日本語で出力してください。
 4. 「タイトル」「説明」などの見出しやメタ情報は含めず、キャラクターのセリフ（本文）のみを出力してください。
 5. メッセージの長さは概ね {target_length} 文字程度を目安にしてください。
+"""
 
+PR_SYSTEM_PROMPT = PERSONA_PROMPT + """
 入力コード/要約:
 {input_text}
 """
 
+# Chat variant: everything that only depends on the character goes into the system
+# message, so it is byte-identical across requests and Ollama can reuse its KV cache.
+PR_CHAT_SYSTEM_PROMPT = PERSONA_PROMPT + """6. ユーザーから渡される入力コード/要約をもとにメッセージを作成してください。
+"""
+
+PR_CHAT_USER_PROMPT = """入力コード/要約:
+{input_text}
+"""
+
+# Appended after the quote section in either layout
+QUOTE_INSTRUCTION = "\n上記の【参考】セリフの口調や言い回しを**可能な限り忠実に**再現し、なりきってください。"
+
+DIFF_SUMMARY_PROMPT = """
+あなたは熟練したソフトウェアエンジニアです。以下は大きな変更差分の一部です。
+この部分で何が変更されたのかを、日本語の箇条書きで簡潔に要約してください。
+ファイル名と変更の意図を中心に、コードそのものは引用しないでください。
+
+差分:
+{diff}
+"""
+
+DIFF_REDUCE_PROMPT = """
+あなたは熟練したソフトウェアエンジニアです。以下は一つの大きな変更差分を分割して要約したものです。
+重複をまとめ、変更全体の要点が分かるように、日本語の箇条書きで一つの要約に統合してください。
+
+部分ごとの要約:
+{summaries}
+"""
+
+def build_request_input(command: str, inputs: str) -> str:
+    """Prefixes the user's input with the kind of message being requested."""
+    if command == "merge":
+        return f"This is a MERGE request. Input details: {inputs}"
+    return f"This is a PULL REQUEST. Input changes: {inputs}"
+
+def _with_quotes(text: str, search_context: str) -> str:
+    """Appends the quote section and its instruction, if there are quotes."""
+    return text + "\n\n" + search_context + QUOTE_INSTRUCTION if search_context else text
+
 def get_messages(character_config: dict, inputs: str, search_context: str = "", target_length: int = 300):
     name = character_config.get("name", "Unknown")
     work = character_config.get("work", "Unknown")
@@ -29,7 +71,28 @@ def get_messages(character_config: dict, inputs: str, search_context: str = "",
         input_text=inputs
     )
     
-    if search_context:
-        prompt += "\n\n" + search_context + "\n上記の【参考】セリフの口調や言い回しを**可能な限り忠実に**再現し、なりきってください。"
-    
-    return prompt
+    return _with_quotes(prompt, search_context)
+
+def get_chat_messages(character_config: dict, inputs: str, search_context: str = "", target_length: int = 300):
+    """Builds /api/chat messages: a stable per-character system message and a per-request user turn."""
+    system = PR_CHAT_SYSTEM_PROMPT.format(
+        name=character_config.get("name", "Unknown"),
+        work=character_config.get("work", "Unknown"),
+        description=character_config.get("description", ""),
+        target_length=target_length
+    )
+
+    user = _with_quotes(PR_CHAT_USER_PROMPT.format(input_text=inputs), search_context)
+
+    return [
+        {"role": "system", "content": system},
+        {"role": "user", "content": user},
+    ]
+
+def build_prompt(character_config: dict, inputs: str, search_context: str = "", config: dict = None):
+    """Returns chat messages when `use_chat` is set in config, otherwise a single prompt string."""
+    config = config or {}
+    target_length = config.get("target_length", 300)
+    if config.get("use_chat", False):
+        return get_chat_messages(character_config, inputs, search_context, target_length=target_length)
+    return get_messages(character_config, inputs, search_context, target_length=target_length)
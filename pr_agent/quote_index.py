@@ -0,0 +1,175 @@
+"""
+Offline quote corpus per character, built by `main.py index`.
+
+Quotes come from web search results and/or user-supplied files. They are
+deduplicated and stored in one compact JSON file. At generation time the
+top-k quotes are picked by BM25 against the diff or summary, so no network
+access is needed and selection takes milliseconds.
+"""
+import json
+import math
+import os
+import random
+import re
+import threading
+import time
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+INDEX_PATH = os.path.join(os.path.dirname(__file__), ".cache", "quote_index.json")
+
+# ASCII words, or runs of kana/kanji (which have no spaces to split on)
+WORD_RE = re.compile(r"[a-z0-9_]+|[\u3040-\u30ff\u3400-\u9fff\uff66-\uff9f]+")
+QUOTED_RE = re.compile(r"「([^「」]{4,120})」")
+# Search snippets without 「」 are kept up to this length
+MAX_SNIPPET_CHARS = 200
+
+def tokenize(text: str) -> List[str]:
+    """Lower-cased ASCII words plus character bigrams of Japanese runs."""
+    tokens = []
+    for word in WORD_RE.findall(text.lower()):
+        if word.isascii():
+            tokens.append(word)
+        elif len(word) == 1:
+            tokens.append(word)
+        else:
+            tokens.extend(word[i:i + 2] for i in range(len(word) - 1))
+    return tokens
+
+def extract_quotes(snippet: str) -> List[str]:
+    """The 「」-quoted lines of a search snippet, or the (trimmed) snippet itself if it has none."""
+    quoted = QUOTED_RE.findall(snippet)
+    if quoted:
+        return quoted
+    snippet = " ".join(snippet.split())
+    return [snippet[:MAX_SNIPPET_CHARS]] if snippet else []
+
+def load_quote_file(path: str) -> List[str]:
+    """Reads quotes from a JSON list of strings or a text file with one quote per line."""
+    with open(path, "r", encoding='utf-8') as f:
+        if path.endswith(".json"):
+            return [str(quote) for quote in json.load(f)]
+        return [line.strip() for line in f if line.strip()]
+
+def dedupe_quotes(quotes: Iterable[str]) -> List[str]:
+    """Drops blank quotes, duplicates (ignoring whitespace and case) and quotes contained in a longer one."""
+    unique = {}
+    for quote in quotes:
+        quote = " ".join(quote.split())
+        key = "".join(quote.lower().split())
+        if key and key not in unique:
+            unique[key] = quote
+    # Longest first, so a fragment is compared against the quotes that could contain it
+    keys = sorted(unique, key=len, reverse=True)
+    kept = []
+    for key in keys:
+        if not any(key in longer for longer in kept):
+            kept.append(key)
+    kept = set(kept)
+    return [quote for key, quote in unique.items() if key in kept]
+
+def build_bm25(documents: List[List[str]]) -> dict:
+    """Per-document term counts and lengths plus the IDF of every term, for bm25_scores."""
+    doc_freq = Counter(term for document in documents for term in set(document))
+    total = len(documents)
+    return {
+        "counts": [Counter(document) for document in documents],
+        "lengths": [len(document) for document in documents],
+        "avg_length": (sum(len(document) for document in documents) / total if total else 0) or 1.0,
+        "idf": {term: math.log(1 + (total - count + 0.5) / (count + 0.5)) for term, count in doc_freq.items()},
+    }
+
+def bm25_scores(query: List[str], model: dict, k1: float = 1.5, b: float = 0.75) -> List[float]:
+    """Okapi BM25 score of each document in `model` (see build_bm25) for the query terms."""
+    idf = model["idf"]
+    terms = [term for term in set(query) if term in idf]
+    scores = []
+    for counts, length in zip(model["counts"], model["lengths"]):
+        norm = k1 * (1 - b + b * length / model["avg_length"])
+        scores.append(sum(idf[term] * counts[term] * (k1 + 1) / (counts[term] + norm)
+                          for term in terms if term in counts))
+    return scores
+
+class QuoteIndex:
+    """
+    Quotes per (character, work), stored in one JSON file. The file is re-read
+    only when it changes, and each character's quotes are tokenized once, so a
+    long-running process (the daemon, the Web UI) selects quotes without I/O.
+    """
+
+    def __init__(self, path: str = INDEX_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._mtime = None
+        self._entries = {}
+        self._models = {}
+
+    @classmethod
+    def from_config(cls, config: dict) -> "QuoteIndex":
+        return cls(path=config.get("quote_index_path", INDEX_PATH))
+
+    @staticmethod
+    def make_key(character: str, work: str) -> str:
+        return "\t".join([character, work])
+
+    def _load(self) -> Dict[str, dict]:
+        """Returns the entries, re-reading the file if it changed. Call with the lock held."""
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+        if mtime != self._mtime:
+            entries = {}
+            if mtime is not None:
+                try:
+                    with open(self.path, "r", encoding='utf-8') as f:
+                        entries = json.load(f)
+                except ValueError:
+                    pass
+            self._mtime, self._entries, self._models = mtime, entries, {}
+        return self._entries
+
+    def quotes(self, character: str, work: str = "") -> List[str]:
+        with self._lock:
+            entry = self._load().get(self.make_key(character, work))
+            return list(entry["quotes"]) if entry else []
+
+    def put(self, character: str, work: str, quotes: List[str]):
+        """Replaces the quotes of one character (pass [] to remove it)."""
+        with self._lock:
+            entries = dict(self._load())
+            key = self.make_key(character, work)
+            if quotes:
+                entries[key] = {"quotes": quotes, "built_at": time.time()}
+            else:
+                entries.pop(key, None)
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w", encoding='utf-8') as f:
+                json.dump(entries, f, ensure_ascii=False, separators=(",", ":"))
+            os.replace(tmp_path, self.path)
+
+    def top_k(self, character: str, work: str, query: str, k: int = 3,
+              seed: Optional[int] = None) -> List[Tuple[str, float]]:
+        """
+        The `k` quotes most relevant to `query` by BM25, with their scores.
+        Slots no quote matches are filled by a (seeded) random pick, so there
+        is always context when the character has quotes.
+        """
+        key = self.make_key(character, work)
+        with self._lock:
+            entry = self._load().get(key)
+            if not entry:
+                return []
+            quotes = entry["quotes"]
+            if key not in self._models:
+                self._models[key] = build_bm25([tokenize(quote) for quote in quotes])
+            model = self._models[key]
+
+        scores = bm25_scores(tokenize(query), model)
+        ranked = sorted((index for index, score in enumerate(scores) if score > 0), key=lambda index: -scores[index])[:k]
+        if len(ranked) < k:
+            rng = random.Random(seed) if seed is not None else random
+            rest = [index for index in range(len(quotes)) if scores[index] <= 0]
+            ranked += rng.sample(rest, min(k - len(ranked), len(rest)))
+        return [(quotes[index], round(scores[index], 3)) for index in ranked]
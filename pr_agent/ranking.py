@@ -0,0 +1,52 @@
+import re
+from typing import Dict, List
+
+# Lines that look like document structure instead of a character's speech
+HEADING_RE = re.compile(r"^\s*(#{1,6}\s|\*\*[^*]+\*\*\s*[:：]?\s*$|(タイトル|説明|概要|変更点|Title|Summary|Description)\s*[:：])",
+                        re.IGNORECASE)
+CATCHPHRASE_RE = re.compile(r"「([^」]+)」")
+
+# Relative weight of each criterion in the overall score
+WEIGHTS = {"length": 0.5, "character": 0.3, "format": 0.2}
+
+def catchphrases(character_config: dict) -> List[str]:
+    """Phrases quoted with 「」 in the character description, e.g. 「うむ！」 or 「〜だよ」."""
+    phrases = []
+    for phrase in CATCHPHRASE_RE.findall(character_config.get("description", "")):
+        # 「〜だよ」 describes a sentence ending; match the ending itself
+        phrase = phrase.lstrip("〜~").strip()
+        if phrase:
+            phrases.append(phrase)
+    return phrases
+
+def length_score(text: str, target_length: int) -> float:
+    """1.0 at target_length, falling linearly to 0 at twice (or zero times) the target."""
+    if target_length <= 0:
+        return 1.0
+    length = len("".join(text.split()))
+    return max(0.0, 1.0 - abs(length - target_length) / target_length)
+
+def character_score(text: str, character_config: dict) -> float:
+    """Share of the character's catchphrases used (two are enough for a full score)."""
+    phrases = catchphrases(character_config)
+    if not phrases:
+        return 0.5
+    used = sum(1 for phrase in phrases if phrase in text)
+    return min(1.0, used / min(2, len(phrases)))
+
+def format_score(text: str) -> float:
+    """1.0 for plain speech, minus 0.5 for each heading-like line."""
+    headings = sum(1 for line in text.splitlines() if HEADING_RE.match(line))
+    return max(0.0, 1.0 - 0.5 * headings)
+
+def score_message(text: str, character_config: dict, target_length: int = 300) -> Dict[str, float]:
+    """Scores a generated message; returns the per-criterion scores and their weighted `total`."""
+    if not text.strip():
+        return {"length": 0.0, "character": 0.0, "format": 0.0, "total": 0.0}
+    scores = {
+        "length": length_score(text, target_length),
+        "character": character_score(text, character_config),
+        "format": format_score(text),
+    }
+    scores["total"] = sum(WEIGHTS[name] * value for name, value in scores.items())
+    return {name: round(value, 3) for name, value in scores.items()}
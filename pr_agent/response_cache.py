@@ -0,0 +1,97 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Optional
+
+CACHE_PATH = os.path.join(os.path.dirname(__file__), ".cache", "responses.sqlite3")
+
+class ResponseCache:
+    """
+    Content-addressed cache of generated messages, stored in SQLite.
+
+    Entries are keyed by a hash of (model, rendered prompt, generation options)
+    and evicted when older than `max_age` seconds or beyond `max_entries`
+    (least recently used first). Hit/miss counters are kept in the database so
+    the hit rate covers every run, not just the current process.
+    """
+
+    def __init__(self, path: str = CACHE_PATH, max_entries: int = 1000, max_age: float = 30 * 86400):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        # Imported on first use so runs with the cache off do not load sqlite3
+        import sqlite3
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                response TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at);
+            CREATE TABLE IF NOT EXISTS stats (name TEXT PRIMARY KEY, value INTEGER NOT NULL);
+        """)
+        self._conn.commit()
+
+    @classmethod
+    def from_config(cls, config: dict) -> "ResponseCache":
+        return cls(
+            max_entries=config.get("response_cache_max_entries", 1000),
+            max_age=config.get("response_cache_max_age", 30 * 86400),
+        )
+
+    @staticmethod
+    def make_key(model: str, prompt: str, options: Optional[dict] = None) -> str:
+        material = json.dumps({"model": model, "prompt": prompt, "options": options or {}},
+                              sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+    def _count(self, name: str):
+        self._conn.execute(
+            "INSERT INTO stats (name, value) VALUES (?, 1) ON CONFLICT(name) DO UPDATE SET value = value + 1",
+            (name,))
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            now = time.time()
+            row = self._conn.execute(
+                "SELECT response FROM responses WHERE key = ? AND created_at >= ?",
+                (key, now - self.max_age)).fetchone()
+            if row:
+                self._conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+            self._count("hits" if row else "misses")
+            self._conn.commit()
+            return row[0] if row else None
+
+    def put(self, key: str, response: str):
+        with self._lock:
+            now = time.time()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, response, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, response, now, now))
+            self._evict(now)
+            self._conn.commit()
+
+    def _evict(self, now: float):
+        self._conn.execute("DELETE FROM responses WHERE created_at < ?", (now - self.max_age,))
+        self._conn.execute(
+            "DELETE FROM responses WHERE key IN "
+            "(SELECT key FROM responses ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,))
+
+    def hit_rate(self) -> float:
+        """Fraction of lookups (across all runs) that were served from the cache."""
+        with self._lock:
+            stats = dict(self._conn.execute("SELECT name, value FROM stats").fetchall())
+        total = stats.get("hits", 0) + stats.get("misses", 0)
+        return stats.get("hits", 0) / total if total else 0.0
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -1,35 +1,220 @@
-from duckduckgo_search import DDGS
-from typing import List
+from typing import List, Optional, Tuple
+import json
+import os
 import random
+import sys
+import threading
+import time
 
-def search_quotes(character: str, work: str = "") -> List[str]:
+CACHE_PATH = os.path.join(os.path.dirname(__file__), ".cache", "quotes.json")
+
+# Background refreshes of every QuoteCache, so a one-shot CLI can wait for them before exiting
+_refresh_threads: List[threading.Thread] = []
+_refresh_threads_lock = threading.Lock()
+
+def wait_for_refreshes(timeout: float):
     """
-    Search for quotes by a specific character or from a specific work.
+    Waits up to `timeout` seconds in total for running background refreshes.
+    They run on daemon threads, which interpreter exit kills, so a one-shot
+    command calls this after printing its output; the daemon and the Web UI
+    live long enough not to need it.
+    """
+    end = time.monotonic() + timeout
+    with _refresh_threads_lock:
+        threads = list(_refresh_threads)
+    for thread in threads:
+        thread.join(max(0.0, end - time.monotonic()))
+
+class QuoteCache:
+    """
+    On-disk cache of quote search results keyed by (character, work, query).
+
+    Entries younger than `ttl` are served as-is. Entries older than that but within
+    `stale_ttl` are still served, while a background refresh replaces them
+    (stale-while-revalidate). At most `max_entries` are kept, evicting the least
+    recently used. The file is re-read only when it changes, and hits update
+    their access time in memory; it is written with the next put.
     """
-    query = f"{character} {work} 名言 セリフ" if work else f"{character} 名言 セリフ"
+
+    def __init__(self, path: str = CACHE_PATH, ttl: float = 86400, stale_ttl: float = 7 * 86400, max_entries: int = 256):
+        self.path = path
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._refreshing = set()
+        self._mtime = None
+        self._entries = {}
+        # Access times of hits since the last save
+        self._accessed = {}
+
+    @classmethod
+    def from_config(cls, config: dict) -> "QuoteCache":
+        return cls(
+            ttl=config.get("search_cache_ttl", 86400),
+            stale_ttl=config.get("search_cache_stale_ttl", 7 * 86400),
+            max_entries=config.get("search_cache_max_entries", 256),
+        )
+
+    @staticmethod
+    def make_key(character: str, work: str, query: str) -> str:
+        return "\t".join([character, work, query])
+
+    def _load(self) -> dict:
+        """Returns the entries, re-reading the file if it changed. Call with the lock held."""
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+        if mtime != self._mtime:
+            entries = {}
+            if mtime is not None:
+                try:
+                    with open(self.path, "r", encoding='utf-8') as f:
+                        entries = json.load(f)
+                except ValueError:
+                    pass
+            self._mtime, self._entries = mtime, entries
+        return self._entries
+
+    def _save(self, entries: dict):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding='utf-8') as f:
+            json.dump(entries, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+        self._mtime, self._entries = os.stat(self.path).st_mtime_ns, entries
+
+    def get(self, key: str) -> Optional[Tuple[List[str], bool]]:
+        """Returns (quotes, is_fresh), or None if there is no usable entry."""
+        with self._lock:
+            entry = self._load().get(key)
+            if not entry:
+                return None
+            now = time.time()
+            age = now - entry["fetched_at"]
+            if age > self.stale_ttl:
+                return None
+            self._accessed[key] = now
+            return list(entry["quotes"]), age <= self.ttl
+
+    def put(self, key: str, quotes: List[str]):
+        with self._lock:
+            entries = dict(self._load())
+            # Another process may have saved a later access in the meantime
+            for accessed_key, accessed_at in self._accessed.items():
+                entry = entries.get(accessed_key)
+                if entry and accessed_at > entry["accessed_at"]:
+                    entries[accessed_key] = dict(entry, accessed_at=accessed_at)
+            self._accessed.clear()
+            now = time.time()
+            entries[key] = {"quotes": quotes, "fetched_at": now, "accessed_at": now}
+            if len(entries) > self.max_entries:
+                # Evict least recently used entries
+                by_access = sorted(entries, key=lambda k: entries[k]["accessed_at"])
+                for old_key in by_access[:len(entries) - self.max_entries]:
+                    del entries[old_key]
+            self._save(entries)
+
+    def refresh_in_background(self, key: str, fetch):
+        """Re-fetches an entry on a daemon thread unless a refresh is already running."""
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        def run():
+            try:
+                quotes = fetch()
+                if quotes:
+                    self.put(key, quotes)
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        thread = threading.Thread(target=run, daemon=True)
+        with _refresh_threads_lock:
+            _refresh_threads[:] = [t for t in _refresh_threads if t.is_alive()]
+            _refresh_threads.append(thread)
+            thread.start()
+
+def _build_query(character: str, work: str = "") -> str:
+    return f"{character} {work} 名言 セリフ" if work else f"{character} 名言 セリフ"
+
+def _fetch_quotes(query: str, timeout: Optional[float] = None) -> List[str]:
     quotes = []
-    
-    print(f"Searching quotes for: {query}...")
-    
+
+    # Progress goes to stderr: stdout carries --json results and batch JSONL records
+    print(f"Searching quotes for: {query}...", file=sys.stderr)
+
     try:
-        results = DDGS().text(query, max_results=10)
+        # Imported here: duckduckgo_search and its HTTP stack are slow to load and
+        # only needed when search is on and the cache misses
+        from duckduckgo_search import DDGS
+
+        results = DDGS(timeout=max(1, round(timeout)) if timeout else 10).text(query, max_results=10)
         for result in results:
             # Simple heuristic: extract snippets that look like quotes or contain the character name
             snippet = result.get('body', '')
             if snippet:
                 quotes.append(snippet)
     except Exception as e:
-        print(f"Search failed: {e}")
+        print(f"Search failed: {e}", file=sys.stderr)
         return []
 
     return quotes
 
-def get_random_quote_context(character: str, work: str = "") -> str:
-    quotes = search_quotes(character, work)
+def search_quotes(character: str, work: str = "", cache: Optional[QuoteCache] = None,
+                  timeout: Optional[float] = None) -> List[str]:
+    """
+    Search for quotes by a specific character or from a specific work.
+    Results are served from `cache` when given. `timeout` bounds the search request.
+    """
+    query = _build_query(character, work)
+    if cache is None:
+        return _fetch_quotes(query, timeout)
+
+    key = QuoteCache.make_key(character, work, query)
+    cached = cache.get(key)
+    if cached is not None:
+        quotes, fresh = cached
+        if not fresh:
+            cache.refresh_in_background(key, lambda: _fetch_quotes(query, timeout))
+        return quotes
+
+    quotes = _fetch_quotes(query, timeout)
+    if quotes:
+        cache.put(key, quotes)
+    return quotes
+
+def get_random_quote_context(character: str, work: str = "", cache: Optional[QuoteCache] = None,
+                             seed: Optional[int] = None, timeout: Optional[float] = None) -> str:
+    quotes = search_quotes(character, work, cache=cache, timeout=timeout)
     if not quotes:
         return ""
-    
-    # Return a formatted string with a few random quotes to give context to the LLM
-    selected_quotes = random.sample(quotes, min(3, len(quotes)))
-    context = "\n".join([f"- {q}" for q in selected_quotes])
+
+    # Return a formatted string with a few random quotes to give context to the LLM.
+    # A fixed seed keeps the selection (and so the prompt) stable for response caching.
+    rng = random.Random(seed) if seed is not None else random
+    selected_quotes = rng.sample(quotes, min(3, len(quotes)))
+    return format_quote_context(character, selected_quotes)
+
+def format_quote_context(character: str, quotes: List[str]) -> str:
+    """The quote section of the prompt."""
+    context = "\n".join([f"- {q}" for q in quotes])
     return f"【参考: {character}の実際のセリフ/検索結果】\n{context}\n"
+
+def warm_cache(characters: List[dict], cache: QuoteCache) -> int:
+    """Fetches quotes for every character into the cache. Returns the number of entries stored."""
+    stored = 0
+    for character_config in characters:
+        character = character_config.get("name", "")
+        work = character_config.get("work", "")
+        if not character:
+            continue
+        query = _build_query(character, work)
+        quotes = _fetch_quotes(query)
+        if quotes:
+            cache.put(QuoteCache.make_key(character, work, query), quotes)
+            stored += 1
+    return stored
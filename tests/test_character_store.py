@@ -0,0 +1,73 @@
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pr_agent.character_store import CharacterStore, default_store_path
+
+class CharacterStoreSearchTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.store = CharacterStore(os.path.join(self.tmp.name, "characters.sqlite3"))
+        self.store.import_characters([
+            {"name": "100% Hero", "work": "A"},
+            {"name": "1000 Hero", "work": "B"},
+            {"name": "snake_case", "work": "C"},
+            {"name": "snakeXcase", "work": "D"},
+            {"name": "back\\slash", "work": "E"},
+        ])
+
+    def tearDown(self):
+        self.store.close()
+        self.tmp.cleanup()
+
+    def names(self, query):
+        return [character["name"] for character in self.store.search(query)]
+
+    def test_percent_and_underscore_match_literally(self):
+        self.assertEqual(self.names("100%"), ["100% Hero"])
+        self.assertEqual(self.names("_"), ["snake_case"])
+        self.assertEqual(self.store.count("%"), 1)
+
+    def test_backslash_matches_literally(self):
+        self.assertEqual(self.names("\\"), ["back\\slash"])
+
+    def test_search_is_case_insensitive_on_name_and_work(self):
+        self.assertEqual(self.names("HERO"), ["100% Hero", "1000 Hero"])
+        self.assertEqual(self.names("d"), ["snakeXcase"])
+
+class CharacterStoreConfigTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def open(self, config_name, characters):
+        return CharacterStore.from_config({"characters": characters}, os.path.join(self.tmp.name, config_name))
+
+    def test_each_config_gets_its_own_store(self):
+        self.assertEqual(os.path.basename(default_store_path("/x/config.json")), "characters.sqlite3")
+        a = self.open("a.json", [{"name": "Alpha"}])
+        b = self.open("b.json", [{"name": "Beta"}])
+        self.assertIsNotNone(b.find_by_name("Beta"))
+        self.assertIsNone(b.find_by_name("Alpha"))
+        a.close()
+        b.close()
+
+    def test_changed_config_characters_are_reimported(self):
+        store = self.open("a.json", [{"name": "Alpha"}])
+        store.update(store.find_by_name("Alpha")["id"], {"description": "edited in the store"})
+        store.close()
+        # Unchanged config: store edits are kept
+        store = self.open("a.json", [{"name": "Alpha"}])
+        self.assertEqual(store.find_by_name("Alpha")["description"], "edited in the store")
+        store.close()
+        store = self.open("a.json", [{"name": "Alpha"}, {"name": "Beta"}])
+        self.assertEqual(store.count(), 2)
+        store.close()
+
+if __name__ == "__main__":
+    unittest.main()
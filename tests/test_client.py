@@ -0,0 +1,94 @@
+import os
+import socket
+import sys
+import time
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+sys.path.append(os.path.join(ROOT, "benchmarks"))
+
+from pr_agent.client import DeadlineExceeded, OllamaClient
+from stub_ollama import StubOllama
+
+class RetryTest(unittest.TestCase):
+    def setUp(self):
+        self.stubs = []
+
+    def tearDown(self):
+        for stub in self.stubs:
+            stub.stop()
+
+    def start_stub(self, **config) -> StubOllama:
+        stub = StubOllama(**config).start()
+        self.stubs.append(stub)
+        return stub
+
+    def test_5xx_fails_over_to_next_endpoint(self):
+        failing = self.start_stub(error_rate=1.0)
+        working = self.start_stub()
+        client = OllamaClient(endpoints=[failing.api_url, working.api_url], model="gemma3:4b",
+                              retries=0, retry_backoff=0)
+        # Route the first attempt to the failing endpoint
+        client.endpoints[1].in_flight = 1
+        result = client.generate("hello")
+        client.endpoints[1].in_flight = 0
+        self.assertEqual(result.endpoint, working.api_url)
+        self.assertEqual(failing.stub.requests, 1)
+        self.assertEqual(working.stub.requests, 1)
+        client.close()
+
+    def test_timeout_is_not_resent(self):
+        stub = self.start_stub(latency=1.0)
+        client = OllamaClient(api_url=stub.api_url, model="gemma3:4b", timeout=0.3, retries=2, retry_backoff=0)
+        start = time.monotonic()
+        with self.assertRaises(Exception) as raised:
+            client.generate("hello")
+        self.assertNotIsInstance(raised.exception, DeadlineExceeded)
+        self.assertLess(time.monotonic() - start, 0.9)
+        self.assertEqual(stub.stub.requests, 1)
+        # Slow is not down
+        self.assertTrue(client.endpoints[0].healthy)
+        client.close()
+
+    def test_deadline_exceeded_within_deadline(self):
+        stub = self.start_stub(latency=2.0)
+        client = OllamaClient(api_url=stub.api_url, model="gemma3:4b", timeout=300, retries=2, retry_backoff=0)
+        start = time.monotonic()
+        with self.assertRaises(DeadlineExceeded):
+            client.generate("hello", deadline=start + 0.5)
+        self.assertLess(time.monotonic() - start, 0.8)
+        self.assertEqual(stub.stub.requests, 1)
+        self.assertEqual(client.endpoints[0].in_flight, 0)
+        client.close()
+
+    def test_stale_keep_alive_connection_is_resent(self):
+        stub = self.start_stub()
+        client = OllamaClient(api_url=stub.api_url, model="gemma3:4b", retries=0)
+        client.generate("warm up")
+        pool = client.endpoints[0].pool
+        self.assertEqual(len(pool._idle), 1)
+        # The idle connection's peer has gone away, as when the server drops a keep-alive connection
+        stale, peer = socket.socketpair()
+        peer.close()
+        pool._idle[0].sock.close()
+        pool._idle[0].sock = stale
+        result = client.generate("hello")
+        self.assertTrue(result.text)
+        self.assertEqual(stub.stub.requests, 2)
+        client.close()
+
+class HealthCheckTest(unittest.TestCase):
+    def test_check_reuses_pooled_connection(self):
+        with StubOllama() as stub:
+            client = OllamaClient(api_url=stub.api_url, model="gemma3:4b")
+            self.assertTrue(client.check_connection(timeout=1))
+            pool = client.endpoints[0].pool
+            conn = pool._idle[0]
+            self.assertTrue(client.check_connection(timeout=1))
+            client.generate("hello")
+            self.assertEqual(pool._idle, [conn])
+            client.close()
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,107 @@
+import os
+import sys
+import unittest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pr_agent.diff import compact_diff, estimate_tokens, iter_file_diffs, split_chunks
+
+PY_DIFF = """diff --git a/app/x.py b/app/x.py
+index 1111111..2222222 100644
+--- a/app/x.py
++++ b/app/x.py
+@@ -1,3 +1,3 @@
+ import os
+--- removed comment line
++++ added comment line
+"""
+
+LOCK_DIFF = """diff --git a/yarn.lock b/yarn.lock
+index 3333333..4444444 100644
+--- a/yarn.lock
++++ b/yarn.lock
+@@ -1,2 +1,2 @@
+-foo@1.0.0:
++foo@1.0.1:
+ bar@2.0.0:
+"""
+
+def make_file_diff(path: str, hunks: int, lines_per_hunk: int) -> str:
+    text = f"diff --git a/{path} b/{path}\n--- a/{path}\n+++ b/{path}\n"
+    for h in range(hunks):
+        text += f"@@ -{h * 100 + 1},{lines_per_hunk} +{h * 100 + 1},{lines_per_hunk} @@\n"
+        text += "".join(f" line {h}-{i} of {path}\n" for i in range(lines_per_hunk))
+    return text
+
+class IterFileDiffsTest(unittest.TestCase):
+    def test_content_that_looks_like_headers_stays_in_the_hunk(self):
+        files = list(iter_file_diffs(PY_DIFF.splitlines(keepends=True)))
+        self.assertEqual([f.path for f in files], ["app/x.py"])
+        self.assertEqual(len(files[0].hunks[0]), 4)
+
+    def test_truncated_hunk_ends_at_next_diff_git(self):
+        text = ("diff --git a/x.py b/x.py\n--- a/x.py\n+++ b/x.py\n"
+                "@@ -1,5 +1,5 @@\n-a\n+b\n") + LOCK_DIFF
+        files = list(iter_file_diffs(text.splitlines(keepends=True)))
+        self.assertEqual([f.path for f in files], ["x.py", "yarn.lock"])
+        self.assertEqual(files[0].hunks, [["@@ -1,5 +1,5 @@\n", "-a\n", "+b\n"]])
+
+    def test_truncated_hunk_ends_at_header_pair(self):
+        text = ("--- a/x.py\n+++ b/x.py\n@@ -1,5 +1,5 @@\n-a\n+b\n"
+                "--- a/y.py\n+++ b/y.py\n@@ -1 +1 @@\n-c\n+d\n")
+        files = list(iter_file_diffs(text.splitlines(keepends=True)))
+        self.assertEqual([f.path for f in files], ["x.py", "y.py"])
+        self.assertEqual(len(files[0].hunks[0]), 3)
+
+    def test_preamble_collects_text_before_first_file(self):
+        preamble = []
+        list(iter_file_diffs(("Fix the thing\n\n" + PY_DIFF).splitlines(keepends=True), preamble))
+        self.assertEqual(preamble, ["Fix the thing\n", "\n"])
+
+class CompactDiffTest(unittest.TestCase):
+    def test_lockfiles_are_skipped(self):
+        compacted = compact_diff(PY_DIFF + LOCK_DIFF)
+        self.assertEqual([f.path for f in compacted.files], ["app/x.py"])
+        self.assertEqual(compacted.skipped, ["yarn.lock"])
+        self.assertNotIn("foo@1.0.1", compacted.text())
+
+    def test_lockfile_after_truncated_hunk_is_skipped(self):
+        text = "diff --git a/x.py b/x.py\n--- a/x.py\n+++ b/x.py\n@@ -1,5 +1,5 @@\n-a\n+b\n" + LOCK_DIFF
+        compacted = compact_diff(text)
+        self.assertEqual([f.path for f in compacted.files], ["x.py"])
+        self.assertEqual(compacted.skipped, ["yarn.lock"])
+
+    def test_binary_files_are_skipped(self):
+        text = ("diff --git a/logo.png b/logo.png\nindex 5555555..6666666 100644\n"
+                "Binary files a/logo.png and b/logo.png differ\n") + PY_DIFF
+        compacted = compact_diff(text)
+        self.assertEqual(compacted.skipped, ["logo.png"])
+        self.assertEqual([f.path for f in compacted.files], ["app/x.py"])
+
+class SplitChunksTest(unittest.TestCase):
+    def test_small_files_share_a_chunk(self):
+        files = compact_diff(make_file_diff("a.py", 1, 3) + make_file_diff("b.py", 1, 3)).files
+        chunks = split_chunks(files, 1000)
+        self.assertEqual(len(chunks), 1)
+        self.assertIn("a.py", chunks[0])
+        self.assertIn("b.py", chunks[0])
+
+    def test_large_file_is_split_by_hunk_with_its_header(self):
+        files = compact_diff(make_file_diff("big.py", 4, 20)).files
+        chunks = split_chunks(files, 200)
+        self.assertGreater(len(chunks), 1)
+        for chunk in chunks:
+            self.assertTrue(chunk.startswith("diff --git a/big.py b/big.py\n"))
+            self.assertLessEqual(estimate_tokens(chunk), 200)
+        # Every hunk ends up in exactly one chunk
+        self.assertEqual(sum(chunk.count("@@ -") for chunk in chunks), 4)
+
+    def test_oversized_hunk_is_truncated(self):
+        files = compact_diff(make_file_diff("huge.py", 1, 500)).files
+        chunks = split_chunks(files, 100)
+        self.assertEqual(len(chunks), 1)
+        self.assertTrue(chunks[0].endswith("... (truncated)\n"))
+        self.assertLessEqual(estimate_tokens(chunks[0]), 110)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,78 @@
+import os
+import sys
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+sys.path.append(os.path.join(ROOT, "benchmarks"))
+
+from pr_agent.client import OllamaClient
+from pr_agent.metrics import build_metrics, format_metrics
+from pr_agent.pipeline import generate_message, stop_at_length
+from stub_ollama import StubOllama
+
+class StopAtLengthTest(unittest.TestCase):
+    def test_boundary_in_the_middle_of_a_token(self):
+        tokens = ["あいう", "えお。かき", "くけこ。"]
+        self.assertEqual(list(stop_at_length(tokens, 4)), ["あいう", "えお。"])
+
+    def test_boundary_at_end_of_token_reads_one_more(self):
+        consumed = []
+
+        def stream():
+            for token in ["あいう", "えお。", "かきくけこ。"]:
+                consumed.append(token)
+                yield token
+
+        self.assertEqual(list(stop_at_length(stream(), 4)), ["あいう", "えお。"])
+        # The token after the cut is read to tell whether the stream ended there
+        self.assertEqual(len(consumed), 3)
+
+    def test_no_boundary_passes_everything_through(self):
+        tokens = ["あいう", "えおかき", "くけこ"]
+        self.assertEqual(list(stop_at_length(tokens, 4)), tokens)
+
+    def test_closing_brackets_stay_with_the_sentence(self):
+        tokens = ["「あいう", "えお。」」と", "言った。"]
+        self.assertEqual(list(stop_at_length(tokens, 4)), ["「あいう", "えお。」」"])
+
+    def test_whitespace_is_not_counted(self):
+        # 3 characters without the space, so the first sentence end does not count yet
+        tokens = ["a b。", "cd。", "ef"]
+        self.assertEqual(list(stop_at_length(tokens, 4)), ["a b。", "cd。"])
+
+class GenerateMessageTest(unittest.TestCase):
+    def generate(self, reply: str, target_length: int):
+        with StubOllama(reply=reply) as stub:
+            client = OllamaClient(api_url=stub.api_url, model="gemma3:4b")
+            try:
+                return generate_message(client, "prompt", {"num_predict": 100}, target_length=target_length)
+            finally:
+                client.close()
+
+    def test_cut_in_the_middle_is_flagged_with_client_metrics(self):
+        # The stub streams two characters per token: "あい" "うえ" "お。" "かき" ...
+        result = self.generate("あいうえお。かきくけこ。", 5)
+        self.assertEqual(result.text, "あいうえお。")
+        self.assertTrue(result.stopped_early)
+        self.assertIsNone(result.eval_count)
+        self.assertEqual(result.streamed_tokens, 4)
+        text = format_metrics(build_metrics(result, {}))
+        for name in ("first_token_seconds", "http_seconds", "streamed_tokens", "(stopped at target_length)"):
+            self.assertIn(name, text)
+
+    def test_boundary_on_the_last_token_is_not_flagged(self):
+        result = self.generate("あいうえお。", 5)
+        self.assertEqual(result.text, "あいうえお。")
+        self.assertFalse(result.stopped_early)
+        self.assertEqual(result.eval_count, 3)
+        self.assertNotIn("streamed_tokens", format_metrics(build_metrics(result, {})))
+
+    def test_short_reply_keeps_ollama_metrics(self):
+        result = self.generate("あいうえお。かきくけこ。", 50)
+        self.assertEqual(result.text, "あいうえお。かきくけこ。")
+        self.assertFalse(result.stopped_early)
+        self.assertIsNotNone(result.total_duration)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,93 @@
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pr_agent.search import QuoteCache, search_quotes, wait_for_refreshes
+
+class QuoteCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "quotes.json")
+
+    def tearDown(self):
+        wait_for_refreshes(5)
+        self.tmp.cleanup()
+
+    def backdate(self, key: str, seconds: float):
+        with open(self.path, "r", encoding='utf-8') as f:
+            entries = json.load(f)
+        entries[key]["fetched_at"] -= seconds
+        entries[key]["accessed_at"] -= seconds
+        with open(self.path, "w", encoding='utf-8') as f:
+            json.dump(entries, f)
+        # Make sure the mtime differs from the cache's last save
+        os.utime(self.path, ns=(time.time_ns(), time.time_ns() + 1000))
+
+    def test_fresh_hit_does_not_write(self):
+        cache = QuoteCache(self.path, ttl=60)
+        cache.put("k", ["a", "b"])
+        mtime = os.stat(self.path).st_mtime_ns
+        self.assertEqual(cache.get("k"), (["a", "b"], True))
+        self.assertEqual(os.stat(self.path).st_mtime_ns, mtime)
+
+    def test_stale_hit_starts_one_background_refresh(self):
+        cache = QuoteCache(self.path, ttl=60, stale_ttl=3600)
+        key = QuoteCache.make_key("Hero", "", "Hero 名言 セリフ")
+        cache.put(key, ["old"])
+        self.backdate(key, 120)
+        self.assertEqual(cache.get(key), (["old"], False))
+
+        calls = []
+        release = threading.Event()
+
+        def fetch():
+            calls.append(1)
+            release.wait(5)
+            return ["new"]
+
+        cache.refresh_in_background(key, fetch)
+        cache.refresh_in_background(key, fetch)
+        release.set()
+        wait_for_refreshes(5)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(cache.get(key), (["new"], True))
+
+    def test_stale_hit_through_search_returns_old_quotes(self):
+        cache = QuoteCache(self.path, ttl=60, stale_ttl=3600)
+        key = QuoteCache.make_key("Hero", "", "Hero 名言 セリフ")
+        cache.put(key, ["old"])
+        self.backdate(key, 120)
+        refreshed = []
+        cache.refresh_in_background = lambda k, fetch: refreshed.append(k)
+        self.assertEqual(search_quotes("Hero", cache=cache), ["old"])
+        self.assertEqual(refreshed, [key])
+
+    def test_entry_past_stale_ttl_is_a_miss(self):
+        cache = QuoteCache(self.path, ttl=60, stale_ttl=3600)
+        cache.put("k", ["a"])
+        self.backdate("k", 7200)
+        self.assertIsNone(cache.get("k"))
+        self.assertIsNone(cache.get("missing"))
+
+    def test_put_evicts_least_recently_used_including_unsaved_hits(self):
+        cache = QuoteCache(self.path, max_entries=2)
+        cache.put("a", ["1"])
+        cache.put("b", ["2"])
+        self.backdate("a", 10)
+        self.backdate("b", 5)
+        # "a" is older on disk, but its hit is only recorded in memory until the next put
+        cache.get("a")
+        cache.put("c", ["3"])
+        with open(self.path, "r", encoding='utf-8') as f:
+            entries = json.load(f)
+        self.assertEqual(sorted(entries), ["a", "c"])
+        self.assertGreater(entries["a"]["accessed_at"], entries["c"]["fetched_at"] - 1)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,57 @@
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pr_agent.quote_index import QuoteIndex, dedupe_quotes, extract_quotes, tokenize
+
+class TokenizeTest(unittest.TestCase):
+    def test_ascii_words_are_lowercased(self):
+        self.assertEqual(tokenize("Fix the Login_Form bug!"), ["fix", "the", "login_form", "bug"])
+
+    def test_japanese_runs_become_bigrams(self):
+        self.assertEqual(tokenize("心を燃やせ"), ["心を", "を燃", "燃や", "やせ"])
+        self.assertEqual(tokenize("心"), ["心"])
+
+class ExtractAndDedupeTest(unittest.TestCase):
+    def test_quoted_lines_are_extracted(self):
+        self.assertEqual(extract_quotes("彼は「心を燃やせ」と言った"), ["心を燃やせ"])
+        self.assertEqual(extract_quotes("  no   quotes here "), ["no quotes here"])
+
+    def test_duplicates_and_fragments_are_dropped(self):
+        quotes = ["心を燃やせ", "心を 燃やせ", "胸を張って生きろ 心を燃やせ", "HELLO world", "hello World", ""]
+        self.assertEqual(dedupe_quotes(quotes), ["胸を張って生きろ 心を燃やせ", "HELLO world"])
+
+class TopKTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.index = QuoteIndex(os.path.join(self.tmp.name, "index.json"))
+        self.quotes = ["login is fixed now", "the database never sleeps", "tests tests tests pass",
+                       "a quiet morning", "another quiet evening"]
+        self.index.put("Hero", "Work", self.quotes)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_bm25_ranks_matching_quotes_first(self):
+        ranked = self.index.top_k("Hero", "Work", "fixed the login and added tests", k=2)
+        self.assertEqual([quote for quote, _ in ranked], ["login is fixed now", "tests tests tests pass"])
+        self.assertGreater(ranked[0][1], ranked[1][1])
+
+    def test_unmatched_slots_are_filled_by_seeded_random_pick(self):
+        first = self.index.top_k("Hero", "Work", "database", k=3, seed=7)
+        again = QuoteIndex(self.index.path).top_k("Hero", "Work", "database", k=3, seed=7)
+        self.assertEqual(first[0][0], "the database never sleeps")
+        self.assertEqual(first, again)
+        self.assertEqual(len({quote for quote, _ in first}), 3)
+        self.assertTrue(all(score == 0 for _, score in first[1:]))
+
+    def test_unknown_character_and_empty_put(self):
+        self.assertEqual(self.index.top_k("Nobody", "", "login"), [])
+        self.index.put("Hero", "Work", [])
+        self.assertEqual(self.index.quotes("Hero", "Work"), [])
+
+if __name__ == "__main__":
+    unittest.main()